@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.ChunkHasher import ChunkHasher
+
+"""
+Benchmark of ChunkHasher.
+Hashes the given number of megabytes (default 64) in chunks of several sizes by SHA-256 and reports the throughput
+of hashing in the calling thread, of one task per chunk, of one contiguous slice per thread and of hash_all(),
+which chooses between the calling thread and slices by the average chunk size. The crossover shows where
+MIN_PARALLEL_CHUNK belongs (hashlib only releases the GIL for buffers larger than 2 KiB).
+
+Usage (in folder brutus): python benchmarks/bench_hashing.py [megabytes] [number of threads]
+"""
+
+
+# Return seconds needed to hash contents by function
+def measure(function, contents):
+    start = time.perf_counter()
+    function(contents)
+    return time.perf_counter() - start
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    num_threads = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    hasher = ChunkHasher("sha256", num_threads)
+    executor = hasher._get_executor()
+    methods = [
+        ("Serial", hasher._hash_slice),
+        ("Per chunk", lambda contents: list(executor.map(hasher.hash, contents))),
+        ("Slices", hasher.hash_parallel),
+        ("hash_all", hasher.hash_all),
+    ]
+    print("%d threads" % num_threads)
+    print("{:>9}  {:>8}".format("Chunk", "Chunks") + "".join("  {:>10}".format(name) for name, method in methods)
+          + "   (MB/s)")
+    for chunk_size in (512, 2048, 8192, 2**14, 2**16, 2**18, 2**20):
+        chunk = os.urandom(chunk_size)
+        contents = [chunk] * (megabytes * 10**6 // chunk_size)
+        size = chunk_size * len(contents)
+        line = "{:>9}  {:>8}".format(chunk_size, len(contents))
+        for name, method in methods:
+            line += "  {:>10.1f}".format(size / measure(method, contents) / 10**6)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.core import Sampler
+
+"""
+Benchmark of the placement of contents (Sampler._place_contents).
+Places 10^4 up to the given number of chunks (default 10^7) and reports the time per chunk,
+which stays constant if placement scales linearly.
+
+Usage (in folder brutus): python benchmarks/bench_placement.py [number of chunks]
+"""
+
+
+class _Piece():
+    """ Minimal Chunk (Length and Offset Only), so 10^7 Chunks Fit into Memory. """
+
+    __slots__ = ("length", "offset")
+
+    def __init__(self, length):
+        self.length = length
+        self.offset = None
+
+    def __len__(self):
+        return self.length
+
+    def set_offset(self, offset):
+        self.offset = offset
+
+
+class _File():
+    """ File Whose Chunks Are Placed One by One (Merge Is False). """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get_chunks(self):
+        return self.chunks
+
+
+class _PlacementSampler(Sampler):
+    """ Sampler That Only Places Its Contents. """
+
+    def generate_image(self):
+        return
+
+    def fill_truth_map(self):
+        return
+
+
+# Return seconds needed to place num_chunks chunks of 512 bytes into an image twice as large
+def measure(num_chunks):
+    chunk_size = 512
+    size = 2 * num_chunks * chunk_size // 1000000 + 1
+    sampler = _PlacementSampler(size, ".", ".", False, seed=42)
+    sampler.files = [_File([_Piece(chunk_size) for i in range(num_chunks)])]
+    sampler.reserved_size = num_chunks * chunk_size
+    start = time.perf_counter()
+    contents = sampler._place_contents()
+    seconds = time.perf_counter() - start
+    # Contents are returned sorted by offset and must not overlap
+    for previous, content in zip(contents[:100], contents[1:101]):
+        assert previous.offset + len(previous) <= content.offset
+    return seconds
+
+
+def main():
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 10**7
+    print("{:>12}  {:>10}  {:>14}".format("Chunks", "Seconds", "ns per chunk"))
+    num_chunks = 10**4
+    while num_chunks <= largest:
+        seconds = measure(num_chunks)
+        print("{:>12}  {:>10.3f}  {:>14.1f}".format(num_chunks, seconds, seconds / num_chunks * 1e9))
+        num_chunks *= 10
+
+
+if __name__ == '__main__':
+    main()
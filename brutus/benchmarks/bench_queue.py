@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import multiprocessing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.Pipeline import PipelineQueue
+
+"""
+Benchmark of PipelineQueue.
+Puts the given number of filenames (default 10^5) in batches into a queue that is emptied by one consumer process,
+and reports the rate of puts and gets for several capacities and batch sizes.
+
+Usage (in folder brutus): python benchmarks/bench_queue.py [number of filenames]
+"""
+
+
+# Get batches until None arrives (like a PipelineWorker)
+def _consume(queue):
+    while queue.get() is not None:
+        pass
+
+
+# Return seconds needed to pass num_files filenames in batches of batch_size through queue and metrics of queue
+def measure(num_files, capacity, batch_size):
+    queue = PipelineQueue(capacity)
+    consumer = multiprocessing.Process(target=_consume, args=(queue,))
+    consumer.start()
+    batch = [("/data/corpus/file_%06d.jpg" % i, "JPEG") for i in range(batch_size)]
+    start = time.perf_counter()
+    for i in range(num_files // batch_size):
+        queue.put(batch)
+    queue.put(None)
+    consumer.join()
+    return time.perf_counter() - start, queue.get_metrics()
+
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 10**5
+    print("{:>9}  {:>6}  {:>10}  {:>14}  {:>14}  {:>13}".format(
+        "Capacity", "Batch", "Seconds", "Batches per s", "Files per s", "Blocked puts"))
+    for capacity in (0, 16):
+        for batch_size in (1, 16, 256):
+            seconds, metrics = measure(num_files, capacity, batch_size)
+            print("{:>9}  {:>6}  {:>10.3f}  {:>14.0f}  {:>14.0f}  {:>13}".format(
+                capacity, batch_size, seconds, metrics["puts"] / seconds, num_files / seconds,
+                metrics["blocked_puts"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.ChunkStore import ChunkStore
+from lib.NetworkSink import TCPReceiver, UDPReceiver
+from lib.stages import DiskImage, SendTCP, SendUDP
+
+"""
+Benchmark of the sinks DiskImage, SendTCP and SendUDP.
+Passes the given number of megabytes (default 256) in chunks of several sizes to each sink and reports the
+throughput in MB/s. Network sinks send to receivers on localhost, their time includes receiving all bytes
+(UDP may lose datagrams, so the share of received bytes is reported as well).
+
+Usage (in folder brutus): python benchmarks/bench_sinks.py [megabytes]
+"""
+
+
+class _Counter():
+    """ Counts Bytes Received by a Receiver. """
+
+    def __init__(self):
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def on_chunk(self, name, number, chunk, chunk_hash, algorithm):
+        with self.lock:
+            self.received += len(chunk)
+
+    def on_piece(self, name, number, offset, length, piece, chunk_hash, algorithm):
+        with self.lock:
+            self.received += len(piece)
+
+
+# Return seconds needed to pass contents to sink and share of bytes that arrived
+def measure(sink, contents, contents_path, counter):
+    size = sum(map(len, contents))
+    counter.received = 0
+    chunk_store = ChunkStore(contents_path, "bench")
+    sink.set_chunk_store(chunk_store)
+    sink.set_name("/data/bench.bin")
+    start = time.perf_counter()
+    sink._do_main(contents)
+    sink.close()  # Flushes send buffer
+    chunk_store.close()
+    if not isinstance(sink, DiskImage):
+        # Wait until receiver has got all bytes (or no more bytes arrive)
+        received = -1
+        while counter.received < size and counter.received != received:
+            received = counter.received
+            time.sleep(0.05)
+    seconds = time.perf_counter() - start
+    ChunkStore.clear(contents_path)
+    return seconds, counter.received / size if not isinstance(sink, DiskImage) else 1.0
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    counter = _Counter()
+    tcp_receiver = TCPReceiver(0, counter.on_chunk)
+    udp_receiver = UDPReceiver(0, counter.on_piece)
+    for receiver in (tcp_receiver, udp_receiver):
+        threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    tcp_port = tcp_receiver.server_address[1]
+    udp_port = udp_receiver.server_address[1]
+
+    print("{:>10}  {:>10}  {:>10}  {:>8}  {:>9}".format("Sink", "Chunk", "Seconds", "MB/s", "Received"))
+    with tempfile.TemporaryDirectory() as contents_path:
+        for chunk_size in (4096, 65536, 2**20):
+            chunk = os.urandom(chunk_size)
+            contents = [chunk] * (megabytes * 10**6 // chunk_size)
+            sinks = [("DiskImage", DiskImage([])), ("SendTCP", SendTCP(["127.0.0.1", tcp_port])),
+                     ("SendUDP", SendUDP(["127.0.0.1", udp_port, 8192]))]
+            for name, sink in sinks:
+                seconds, received = measure(sink, contents, contents_path, counter)
+                print("{:>10}  {:>10}  {:>10.3f}  {:>8.1f}  {:>8.1f}%".format(
+                    name, chunk_size, seconds, sum(map(len, contents)) / seconds / 10**6, received * 100))
+    for receiver in (tcp_receiver, udp_receiver):
+        receiver.shutdown()
+        receiver.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+"""
+Benchmark of the startup time of brutus processes.
+Starts a fresh interpreter for each import (default 20 times) and reports the median time, so the cost of the
+lazy imports (e.g. NumPy, libmagic and the stages) shows up as the difference to the empty interpreter.
+
+Usage (in folder brutus): python benchmarks/bench_startup.py [number of runs]
+"""
+
+BRUTUS_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Statements that are timed (each one in a fresh interpreter)
+STATEMENTS = [
+    ("Empty interpreter", "pass"),
+    ("Registry", "import lib.registry"),
+    ("Initiate", "import lib.Initiate"),
+    ("Initiate and File stage", "import lib.Initiate; lib.registry.stages.get('File')"),
+    ("Pipeline worker", "import lib.Pipeline; lib.registry.stages.get('SaveHashes')"),
+    ("Sampler", "import lib.registry; lib.registry.samplers.get('DiskImageSampler')"),
+    ("NumPy (for comparison)", "import numpy"),
+]
+
+
+# Return seconds needed to start interpreter and run statement
+def measure(statement):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], cwd=BRUTUS_PATH, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print("{:<26}  {:>12}  {:>12}".format("Import", "Median ms", "Minimum ms"))
+    for name, statement in STATEMENTS:
+        times = [measure(statement) for i in range(runs)]
+        print("{:<26}  {:>12.1f}  {:>12.1f}".format(name, statistics.median(times) * 1000, min(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .Pipeline import PipelineQueue
+from .Profiler import Profiler
+from .ChunkStore import ChunkStore
+
+
+"""
+Definition of AsyncPipeline
+"""
+
+
+class AsyncPipeline(threading.Thread):
+    """ Pipeline That Processes Several Files at Once Within an Event Loop.
+    Hooks of I/O-Bound Stages (Reading and Writing) Are Awaited in a Pool of Threads,
+    so Waiting for Storage Overlaps with the Processing of Other Files.
+    Each File in Flight Has Its Own Linked List of Stages. """
+
+    def __init__(self, pipeline: dict, create_stages, file_type: str, contents_path: str, in_flight: int,
+                 profiler: Profiler = None, capacity: int = 0):
+        super(AsyncPipeline, self).__init__()
+        self.pipeline = pipeline  # Pipeline definition of JSON file
+        self.create_stages = create_stages  # Function that builds up a linked list of stages out of definition
+        self.file_type = file_type
+        self.contents_path = contents_path
+        self.in_flight = in_flight  # Maximum number of files that are processed at once
+        self.profiler = profiler
+        self.name = file_type + "-Pipeline"
+        self.queue = PipelineQueue(capacity)
+        self.queue.set_consumer(self.is_consuming)
+
+    # Return False if pipeline has exited (True as long as it hasn't been started)
+    def is_consuming(self):
+        return self.ident is None or self.is_alive()
+
+    def add_to_queue(self, filename: str, file_type: str = None, timeout: float = None):
+        if filename == "/END/":
+            self.queue.put(filename)
+        else:
+            self.queue.put([(filename, file_type)], timeout)
+
+    # Put list of (filename, file type) tuples into queue at once
+    def add_batch(self, batch: list, timeout: float = None):
+        self.queue.put(batch, timeout)
+
+    def get_queue_metrics(self):
+        return self.queue.get_metrics()
+
+    # Files are processed concurrently, so there is no single processed content
+    def output(self):
+        return None
+
+    def run(self):
+        print("==== Starting %s (async, %d in flight)..." % (self.name, self.in_flight))  # TRACING
+        asyncio.run(self._run())
+        print("\n==== %s exiting..." % self.name)  # TRACING
+
+    # Take filenames out of queue and start processing of each file as soon as a linked list of stages is free.
+    # If processing of a file fails, no further files are started and the exception is raised once the files in
+    # flight are done (like the thread runtime, which stops at the failed file).
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        chunk_store = ChunkStore(self.contents_path, self.file_type)
+        free_stages = asyncio.Queue()  # Linked lists of stages that are not processing a file
+        for i in range(self.in_flight):
+            first_stage = self.create_stages(self.pipeline)
+            first_stage.set_chunk_store(chunk_store)
+            if self.profiler is not None:
+                first_stage.set_profiler(self.profiler, self.name)
+            free_stages.put_nowait(first_stage)
+        tasks = set()
+        errors = []  # Exceptions of files whose processing has failed
+
+        def on_done(task):
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception())
+
+        # Threads for I/O-bound stages of all files in flight and one thread waiting for the queue
+        with ThreadPoolExecutor(max_workers=self.in_flight) as executor, \
+                ThreadPoolExecutor(max_workers=1) as queue_reader:
+            while True:
+                wait_start = time.perf_counter()
+                item = await loop.run_in_executor(queue_reader, self.queue.get)
+                if self.profiler is not None:
+                    self.profiler.record_wait(self.name, wait_start, time.perf_counter())
+                # "/END/" indicates that there are no more filenames to collect
+                if item == "/END/" or errors:
+                    break
+                for filename, file_type in item:
+                    first_stage = await free_stages.get()
+                    if errors:
+                        free_stages.put_nowait(first_stage)
+                        break
+                    task = asyncio.create_task(self._process_file(first_stage, free_stages, filename, file_type,
+                                                                  executor))
+                    tasks.add(task)
+                    task.add_done_callback(on_done)
+            # (Exceptions are collected by on_done)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        while not free_stages.empty():
+            free_stages.get_nowait().close()
+        chunk_store.close()
+        if errors:
+            raise errors[0]
+
+    # Process one file by linked list of stages and free linked list afterwards
+    async def _process_file(self, first_stage, free_stages, filename, file_type, executor):
+        file_start = time.perf_counter()
+        print("\n==== %s got '%s'" % (self.name, filename.split('/')[-1]))
+        try:
+            first_stage.set_name(filename)
+            first_stage.set_contents_path(self.contents_path)
+            first_stage.set_type(file_type)
+            await first_stage.start_async(executor)
+        finally:
+            free_stages.put_nowait(first_stage)
+        if self.profiler is not None:
+            self.profiler.record_file(self.name, filename, file_start, time.perf_counter())
+        print("\n==== %s finished to process '%s'" % (self.name, filename.split('/')[-1]))  # TRACING
@@ -0,0 +1,143 @@
+import os
+import functools
+import numpy
+from abc import ABCMeta, abstractmethod
+
+"""
+Background Models:
+    RandomBackground, ZeroBackground, PatternBackground, ResidueBackground
+"""
+
+
+class Background(metaclass=ABCMeta):
+    """ Basic Abstract Background Class.
+    A Background Model Provides the Bytes of an Image That Are Not Covered by Contents. """
+
+    # If True, the background consists of zeros only and doesn't need to be written (holes of a sparse file)
+    sparse = False
+    # If True, each block only depends on its position, so blocks can be generated in any order
+    seekable = True
+
+    def __init__(self, seed: numpy.random.SeedSequence = None, source: str = None):
+        if seed is None:
+            seed = numpy.random.SeedSequence()
+        self.seed = seed  # Seed of the random stream of the background
+        self.source = source
+
+    # Return background bytes of the image from position to position + length
+    @abstractmethod
+    def get_block(self, position: int, length: int):
+        return
+
+
+class RandomBackground(Background):
+    """ Fast Seeded Random Bytes (Default).
+    Each Block of BLOCK_SIZE Bytes Has Its Own Generator (PCG64) Seeded by the Block Number,
+    so the Background Is Reproducible and Any Part of It Can Be Generated on Its Own. """
+
+    BLOCK_SIZE = 2**20
+    # Number of recently generated blocks that are kept (small reads of a virtual image hit the same blocks)
+    CACHED_BLOCKS = 16
+
+    def __init__(self, seed=None, source=None):
+        Background.__init__(self, seed, source)
+        self._generate = functools.lru_cache(maxsize=self.CACHED_BLOCKS)(self._generate)
+
+    def get_block(self, position, length):
+        block = bytearray()
+        first = position // self.BLOCK_SIZE
+        last = (position + length - 1) // self.BLOCK_SIZE
+        for number in range(first, last + 1):
+            block += self._generate(number)
+        start = position - first * self.BLOCK_SIZE
+        if start == 0 and len(block) == length:
+            return block
+        return block[start:start + length]
+
+    # Return random bytes of block with number
+    def _generate(self, number):
+        # Same seed as the number-th child of the background's seed sequence
+        block_seed = numpy.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key + (number,))
+        return numpy.random.Generator(numpy.random.PCG64(block_seed)).bytes(self.BLOCK_SIZE)
+
+
+class ZeroBackground(Background):
+    """ Zeros. Streamed Images Are Written as Sparse Files, so Only the Contents Occupy Storage. """
+
+    sparse = True
+
+    def get_block(self, position, length):
+        return bytes(length)
+
+
+class PatternBackground(Background):
+    """ Repeated Pattern (Source Is the Pattern as Text, by Default All Byte Values in Ascending Order). """
+
+    def __init__(self, seed=None, source=None):
+        Background.__init__(self, seed, source)
+        if source:
+            self.pattern = bytes(source, "utf-8")
+        else:
+            self.pattern = bytes(range(256))
+
+    # The pattern continues at the position of the block
+    def get_block(self, position, length):
+        start = position % len(self.pattern)
+        repetitions = (start + length) // len(self.pattern) + 1
+        return (self.pattern * repetitions)[start:start + length]
+
+
+class ResidueBackground(Background):
+    """ Realistic Filesystem Residue: Random Pieces of the Files of a Corpus Folder (Source).
+    Pieces Are Drawn One After Another, so Blocks Have to Be Generated in Order. """
+
+    seekable = False
+
+    # Range of sizes of a single piece of residue in bytes
+    MIN_PIECE = 4096
+    MAX_PIECE = 2**20
+
+    def __init__(self, seed=None, source=None):
+        Background.__init__(self, seed, source)
+        if not source or not os.path.isdir(source):
+            raise Exception('Background "residue" requires a corpus folder as "background_source".')
+        self.generator = numpy.random.default_rng(self.seed)
+        self.paths = []
+        sizes = []
+        for root, subdirs, files in os.walk(source):
+            for filename in files:
+                path = os.path.join(root, filename)
+                size = os.path.getsize(path)
+                if size > 0:
+                    self.paths.append(path)
+                    sizes.append(size)
+        if len(self.paths) == 0:
+            raise Exception("Corpus folder %s for background contains no files." % source)
+        # Files are picked proportionally to their sizes
+        self.weights = numpy.array(sizes, dtype=numpy.float64) / sum(sizes)
+        self.sizes = sizes
+
+    def get_block(self, position, length):
+        block = bytearray()
+        while len(block) < length:
+            i = self.generator.choice(len(self.paths), p=self.weights)
+            piece_length = min(int(self.generator.integers(self.MIN_PIECE, self.MAX_PIECE, endpoint=True)),
+                               self.sizes[i], length - len(block))
+            start = int(self.generator.integers(0, self.sizes[i] - piece_length, endpoint=True))
+            with open(self.paths[i], 'rb') as file:
+                file.seek(start)
+                block += file.read(piece_length)
+        return block
+
+
+# Background model by name
+# ("pcg" is kept as a name for the default random background)
+BACKGROUNDS = {"random": RandomBackground, "zero": ZeroBackground, "pcg": RandomBackground,
+               "pattern": PatternBackground, "residue": ResidueBackground}
+
+
+# Create background model by its name
+def create_background(name: str, seed: numpy.random.SeedSequence = None, source: str = None):
+    if name not in BACKGROUNDS:
+        raise Exception('Unknown background "%s". Supported: %s.' % (name, ", ".join(BACKGROUNDS)))
+    return BACKGROUNDS[name](seed, source)
@@ -0,0 +1,61 @@
+import os
+import multiprocessing
+
+"""
+Definition of BatchSampler
+"""
+
+# Contents loaded once per process and shared by all variants generated in it
+_files = None
+
+
+class BatchSampler():
+    """ Generates Many Variants of an Image out of One Contents Folder.
+    The Contents Are Loaded Once and Shared by All Variants (Forked Worker Processes Inherit Them,
+    the Chunks Themselves Stay in the Memory Maps of the Chunk Stores).
+    Each Variant Has Its Own Seed, Size, Merge Mode and Output Folder. """
+
+    def __init__(self, sampler_class, contents_path: str, image_path: str, variants: list, num_workers: int = 1):
+        # Class of Sampler that generates each variant (it needs to accept the loaded contents as "files")
+        self.sampler_class = sampler_class
+        self.contents_path = contents_path
+        self.image_path = image_path
+        # Parameters of each variant: (size, merge, keyword arguments)
+        self.variants = variants
+        self.num_workers = num_workers
+
+    # Generate images and truth maps of all variants
+    def generate_images(self):
+        global _files
+        _files = self.sampler_class.load_files(self.contents_path)
+        tasks = [(self.sampler_class, self.contents_path, self._get_variant_path(i), size, merge, options)
+                 for i, (size, merge, options) in enumerate(self.variants)]
+        print("\n==== Generating %d variants..." % len(tasks))  # TRACING
+        if self.num_workers == 1:
+            for task in tasks:
+                _generate_variant(task)
+            return
+        # Workers are created after contents have been loaded, so forked workers don't load them again
+        with multiprocessing.Pool(self.num_workers, _init_worker, (self.sampler_class, self.contents_path)) as pool:
+            for variant_path in pool.imap_unordered(_generate_variant, tasks):
+                print("\n==== Variant has been written to", variant_path)  # TRACING
+
+    # Return folder of variant i
+    def _get_variant_path(self, i):
+        return os.path.join(self.image_path, "Variant %d" % i)
+
+
+# Load contents in worker process if they haven't been inherited from the parent process
+def _init_worker(sampler_class, contents_path):
+    global _files
+    if _files is None:
+        _files = sampler_class.load_files(contents_path)
+
+
+# Generate image and truth map of one variant and return its folder
+def _generate_variant(task):
+    sampler_class, contents_path, variant_path, size, merge, options = task
+    sampler = sampler_class(size, contents_path, variant_path, merge, files=_files, **options)
+    sampler.generate_image()
+    sampler.fill_truth_map()
+    return variant_path
@@ -0,0 +1,117 @@
+import os
+import zlib
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash  # Optional, only needed for the xxHash algorithms
+except ImportError:
+    xxhash = None
+
+"""
+Definition of ChunkHasher
+"""
+
+
+class ChunkHasher():
+    """ Hashes Chunks in Parallel with a Configurable Algorithm.
+    hashlib Releases the GIL While Hashing Large Buffers, so Chunks Are Hashed by a Pool of Threads. """
+
+    # Identifier of each algorithm as stored in the index of a chunk store (0 means no hash)
+    ALGORITHMS = {"sha256": 1, "blake2b": 2, "crc32": 3, "xxh64": 4, "xxh3_64": 5, "xxh3_128": 6}
+    # Contents smaller than this (in bytes) are hashed in the calling thread
+    PARALLEL_THRESHOLD = 2**20
+    # Contents whose average size (in bytes) is smaller than this are hashed in the calling thread as well.
+    # hashlib only releases the GIL for buffers larger than 2 KiB, so small chunks don't run in parallel
+    # (see benchmarks/bench_hashing.py for the crossover)
+    MIN_PARALLEL_CHUNK = 2**14
+
+    # Pools of threads shared by all hashers of a process with the same number of threads
+    _executors = {}
+    _executors_pid = None
+    _lock = threading.Lock()
+
+    def __init__(self, algorithm: str = "sha256", num_threads: int = None):
+        if algorithm not in self.ALGORITHMS:
+            raise Exception('Unknown hash algorithm "%s". Supported: %s.'
+                            % (algorithm, ", ".join(self.ALGORITHMS)))
+        if algorithm.startswith("xxh") and xxhash is None:
+            raise Exception('Hash algorithm "%s" requires the xxhash package.' % algorithm)
+        self.algorithm = algorithm
+        self.algorithm_id = self.ALGORITHMS[algorithm]
+        self.num_threads = num_threads or os.cpu_count() or 1
+
+    # Return binary digests of all contents in order
+    def hash_all(self, contents):
+        size = sum(map(len, contents))
+        if self.num_threads == 1 or len(contents) < 2 or size < self.PARALLEL_THRESHOLD \
+                or size < self.MIN_PARALLEL_CHUNK * len(contents):
+            return self._hash_slice(contents)
+        return self.hash_parallel(contents)
+
+    # Return binary digests of all contents in order. Each thread hashes a contiguous slice of the contents,
+    # so there is one task per thread instead of one per content.
+    def hash_parallel(self, contents):
+        slice_size = -(-len(contents) // min(self.num_threads, len(contents)))  # (Rounded up)
+        slices = [contents[i:i + slice_size] for i in range(0, len(contents), slice_size)]
+        hashes = []
+        for slice_hashes in self._get_executor().map(self._hash_slice, slices):
+            hashes.extend(slice_hashes)
+        return hashes
+
+    # Return binary digest of one content
+    def hash(self, content):
+        if self.algorithm == "sha256":
+            return hashlib.sha256(content).digest()
+        if self.algorithm == "blake2b":
+            return hashlib.blake2b(content).digest()
+        if self.algorithm == "crc32":
+            return zlib.crc32(content).to_bytes(4, "big")
+        return getattr(xxhash, self.algorithm)(content).digest()
+
+    # Return object that hashes one content incrementally (by update and digest)
+    def new(self):
+        if self.algorithm == "sha256":
+            return hashlib.sha256()
+        if self.algorithm == "blake2b":
+            return hashlib.blake2b()
+        if self.algorithm == "crc32":
+            return _Crc32()
+        return getattr(xxhash, self.algorithm)()
+
+    # Return name of algorithm for identifier stored in an index
+    @staticmethod
+    def get_name(algorithm_id: int):
+        for name, identifier in ChunkHasher.ALGORITHMS.items():
+            if identifier == algorithm_id:
+                return name
+        return None
+
+    # Return binary digests of slice of contents (in the calling thread)
+    def _hash_slice(self, contents):
+        return [self.hash(content) for content in contents]
+
+    # Return pool of threads of current process with the number of threads of this hasher
+    # (a forked process creates its own pools)
+    def _get_executor(self):
+        with ChunkHasher._lock:
+            if ChunkHasher._executors_pid != os.getpid():
+                ChunkHasher._executors = {}
+                ChunkHasher._executors_pid = os.getpid()
+            if self.num_threads not in ChunkHasher._executors:
+                ChunkHasher._executors[self.num_threads] = ThreadPoolExecutor(max_workers=self.num_threads)
+            return ChunkHasher._executors[self.num_threads]
+
+
+class _Crc32():
+    """ Incremental CRC-32 with the Interface of hashlib. """
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, content):
+        self.value = zlib.crc32(content, self.value)
+
+    def digest(self):
+        return self.value.to_bytes(4, "big")
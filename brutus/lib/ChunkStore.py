@@ -0,0 +1,221 @@
+import os
+import glob
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+import threading
+
+"""
+Definition of ChunkStore
+"""
+
+
+class ChunkStore():
+    """ Packed, Append-Only Store for the Chunks of One Pipeline.
+    All Chunks Are Appended to One Data File. Their Locations and Hashes Are Recorded in a Binary Index. """
+
+    # Index record: length of content name, chunk number, offset in data file, length of chunk,
+    # hash algorithm (see ChunkHasher.ALGORITHMS), length of hash (followed by content name and hash)
+    RECORD = struct.Struct("<HIQQBB")
+    # Pieces of a chunk are buffered in memory up to this size and in a temporary file beyond it
+    SPOOL_SIZE = 2**24
+
+    # Views of memory maps of data files that have been mapped in by this process
+    _data_maps = {}
+    _data_maps_lock = threading.Lock()
+
+    def __init__(self, contents_path: str, name: str):
+        self.data_path = os.path.join(contents_path, name + ".dat")
+        self.index_path = os.path.join(contents_path, name + ".idx")
+        # Hashes of the files that have been processed completely (read to update the manifest)
+        self.files_path = os.path.join(contents_path, name + ".files")
+        self.data_file = None
+        self.index_file = None
+        # (Hash, algorithm) of chunks by (content name, chunk number) that have not been written or sent yet
+        self.hashes = {}
+        self.lock = threading.Lock()
+        # Held while a chunk is written, so the pieces of a chunk stay contiguous in the data file
+        self.write_lock = threading.Lock()
+
+    # Keep hashes of chunks with numbers from first_number on until the chunks are appended or sent
+    # (hashes are set by SaveHashes)
+    def add_hashes(self, content_name: str, hashes: list, algorithm: int, first_number: int = 1):
+        with self.lock:
+            for number, chunk_hash in enumerate(hashes, first_number):
+                self.hashes[(content_name, number)] = (chunk_hash, algorithm)
+
+    # Record SHA-256 hash (hex) of file that has been processed completely,
+    # so the manifest is updated without reading the file again
+    def add_file(self, path: str, file_hash: str):
+        with self.lock:
+            with open(self.files_path, 'a') as files_file:
+                files_file.write(json.dumps([path, file_hash]) + "\n")
+
+    # Append chunk to data file and record its location and hash in index
+    # (if keep_hash is True, the hash is kept for a following stage that sends the chunk)
+    def append(self, content_name: str, number: int, content, keep_hash: bool = False):
+        with self.write_lock:
+            offset = self._open().tell()
+            self.data_file.write(content)
+            self._write_record(content_name, number, offset, len(content), keep_hash)
+
+    # Append chunk that arrives in pieces (e.g. of a streamed file) and pass on each (piece, last) pair.
+    # Pieces are buffered (in a temporary file beyond SPOOL_SIZE) and the chunk is appended as a whole after its
+    # last piece, so the write lock is not held while pieces are passed on (other chunks can be written meanwhile).
+    def write_pieces(self, content_name: str, number: int, pieces, keep_hash: bool = False):
+        buffer = None
+        for piece, last in pieces:
+            if last and buffer is None:
+                # Chunk consists of one piece
+                self.append(content_name, number, piece, keep_hash)
+                yield piece, last
+                continue
+            if buffer is None:
+                buffer = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+            buffer.write(piece)
+            if last:
+                length = buffer.tell()
+                buffer.seek(0)
+                with self.write_lock:
+                    offset = self._open().tell()
+                    shutil.copyfileobj(buffer, self.data_file)
+                    self._write_record(content_name, number, offset, length, keep_hash)
+                buffer.close()
+                buffer = None
+            yield piece, last
+
+    # Return (hash, algorithm) of chunk and forget it (empty hash and algorithm 0 if chunk hasn't been hashed)
+    def pop_hash(self, content_name: str, number: int):
+        with self.lock:
+            return self.hashes.pop((content_name, number), (b'', 0))
+
+    # Return (hash, algorithm) of chunk and keep it for a following stage
+    def get_hash(self, content_name: str, number: int):
+        with self.lock:
+            return self.hashes.get((content_name, number), (b'', 0))
+
+    def _open(self):
+        if self.data_file is None:
+            # Data file grows, so a map of it in this process is outdated
+            ChunkStore._drop_data_maps([self.data_path])
+            self.data_file = open(self.data_path, 'ab')
+            self.index_file = open(self.index_path, 'ab')
+        return self.data_file
+
+    # Record location of chunk and its hash (if SaveHashes has kept one) in index
+    def _write_record(self, content_name, number, offset, length, keep_hash):
+        if keep_hash:
+            chunk_hash, algorithm = self.get_hash(content_name, number)
+        else:
+            chunk_hash, algorithm = self.pop_hash(content_name, number)
+        name = content_name.encode("utf-8", "surrogateescape")
+        self.index_file.write(self.RECORD.pack(len(name), number, offset, length, algorithm,
+                                               len(chunk_hash)) + name + chunk_hash)
+
+    def close(self):
+        with self.write_lock:
+            if self.data_file is not None:
+                self.data_file.close()
+                self.index_file.close()
+                self.data_file = None
+                self.index_file = None
+                ChunkStore._drop_data_maps([self.data_path])
+
+    # Return all records of all stores in contents path as list of tuples
+    # (data path, content name, chunk number, offset, length, hash, hash algorithm)
+    @staticmethod
+    def read_index(contents_path: str):
+        records = []
+        for index_path in sorted(glob.glob(os.path.join(glob.escape(contents_path), "*.idx"))):
+            data_path = index_path[:-len(".idx")] + ".dat"
+            for record in ChunkStore._parse_index(index_path):
+                records.append((data_path,) + record)
+        return records
+
+    # Remove records of contents from all indexes in contents path
+    # (their chunks remain in data files but are not referenced anymore)
+    @staticmethod
+    def remove(contents_path: str, content_names: set):
+        ChunkStore._drop_data_maps(glob.glob(os.path.join(glob.escape(contents_path), "*.dat")))
+        for index_path in glob.glob(os.path.join(glob.escape(contents_path), "*.idx")):
+            records = ChunkStore._parse_index(index_path)
+            kept = [record for record in records if record[0] not in content_names]
+            if len(kept) == len(records):
+                continue
+            with open(index_path, 'wb') as index_file:
+                for name, number, offset, length, chunk_hash, algorithm in kept:
+                    name = name.encode("utf-8", "surrogateescape")
+                    index_file.write(ChunkStore.RECORD.pack(len(name), number, offset, length, algorithm,
+                                                            len(chunk_hash)) + name + chunk_hash)
+
+    # Delete all data files and indexes in contents path (e.g. if they have been written in an older format)
+    @staticmethod
+    def clear(contents_path: str):
+        for extension in ("*.idx", "*.dat", "*.files"):
+            for path in glob.glob(os.path.join(glob.escape(contents_path), extension)):
+                ChunkStore._drop_data_maps([path])
+                os.unlink(path)
+
+    # Return hashes of processed files of all stores in contents path by path
+    @staticmethod
+    def read_files(contents_path: str):
+        file_hashes = {}
+        for files_path in sorted(glob.glob(os.path.join(glob.escape(contents_path), "*.files"))):
+            with open(files_path) as files_file:
+                for line in files_file:
+                    if line.endswith("\n"):  # (Last line of an interrupted session may be incomplete)
+                        path, file_hash = json.loads(line)
+                        file_hashes[path] = file_hash
+        return file_hashes
+
+    # Delete hashes of processed files of all stores in contents path (after they have been read)
+    @staticmethod
+    def clear_files(contents_path: str):
+        for path in glob.glob(os.path.join(glob.escape(contents_path), "*.files")):
+            os.unlink(path)
+
+    # Return view of memory map of data file (each data file is mapped in only once per process)
+    @staticmethod
+    def get_data_map(data_path: str):
+        with ChunkStore._data_maps_lock:
+            if data_path not in ChunkStore._data_maps:
+                ChunkStore._data_maps[data_path] = memoryview(ChunkStore.map_data(data_path))
+            return ChunkStore._data_maps[data_path]
+
+    # Forget maps of data files that have been changed or deleted (they are mapped in again on next access)
+    @staticmethod
+    def _drop_data_maps(data_paths):
+        with ChunkStore._data_maps_lock:
+            for data_path in data_paths:
+                ChunkStore._data_maps.pop(data_path, None)
+
+    # Return memory map of data file
+    @staticmethod
+    def map_data(data_path: str):
+        with open(data_path, 'rb') as data_file:
+            if os.fstat(data_file.fileno()).st_size == 0:
+                return b''  # Empty files can't be mapped
+            return mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Return list of records (content name, chunk number, offset, length, hash, hash algorithm) of index file
+    @staticmethod
+    def _parse_index(index_path):
+        records = []
+        with open(index_path, 'rb') as index_file:
+            index = index_file.read()
+        position = 0
+        record_size = ChunkStore.RECORD.size
+        while position + record_size <= len(index):
+            record = ChunkStore.RECORD.unpack_from(index, position)
+            name_length, number, offset, length, algorithm, hash_length = record
+            position += record_size
+            if position + name_length + hash_length > len(index):
+                break  # Incomplete record of an interrupted session
+            name = index[position:position + name_length].decode("utf-8", "surrogateescape")
+            position += name_length
+            chunk_hash = index[position:position + hash_length]
+            position += hash_length
+            records.append((name, number, offset, length, chunk_hash, algorithm))
+        return records
@@ -0,0 +1,171 @@
+from . import registry
+
+"""
+Definition of ExecutionPlan and validation of pipeline definitions
+"""
+
+# Hooks of a stage in the order they are run
+PHASES = ("pre", "main", "post")
+
+
+def _identity(self, contents):
+    return contents
+
+
+class _Delegate():
+    def hook(self, contents):
+        contents = super().hook(contents)
+        return contents
+
+
+# Return True if hook only returns its contents (comments like "#print(...)  # TRACING" don't count)
+# or only passes them to the same hook of the parent class which does so (e.g. FileELF._do_main)
+def is_identity(hook):
+    function = getattr(hook, "__func__", hook)
+    code = getattr(function, "__code__", None)
+    if code is None or code.co_argcount != 2:
+        return False
+    if code.co_code == _identity.__code__.co_code:
+        return True
+    instance = getattr(hook, "__self__", None)
+    if instance is None or code.co_code != _Delegate.hook.__code__.co_code \
+            or code.co_names != ("super", function.__name__):
+        return False
+    # Class that defines hook (closure of super()) and hook of its parent class
+    defining_class = function.__closure__[0].cell_contents
+    return is_identity(getattr(super(defining_class, instance), function.__name__))
+
+
+class ExecutionPlan():
+    """ Flat Execution Plan of a Linked List of Stages.
+    The Stages Are Run One after Another in a Loop (Instead of Each Stage Calling the Next One).
+    Hooks That Only Return Their Contents Are Left out and Adjacent Transforms Are Fused,
+    so Each Content Passes through All of Them Before the Next Content Is Processed. """
+
+    def __init__(self, first_stage):
+        self.stages = []  # All stages of linked list
+        stage = first_stage
+        while stage is not None:
+            self.stages.append(stage)
+            stage = stage.next_stage
+        self.steps = []
+        for stage in self.stages:
+            hooks = [(phase, getattr(stage, "_do_" + phase)) for phase in PHASES
+                     if not is_identity(getattr(stage, "_do_" + phase))]
+            if len(hooks) == 0:
+                continue
+            # Profiled stages are measured hook by hook, so they are not fused
+            if stage.transform and stage.profiler is None and [phase for phase, hook in hooks] == ["main"]:
+                if len(self.steps) == 0 or not isinstance(self.steps[-1], _FusedStep):
+                    self.steps.append(_FusedStep())
+                self.steps[-1].add(stage)
+            else:
+                self.steps.append(_StageStep(stage, hooks))
+
+    # Run all steps on contents and return processed contents
+    def run(self, contents, object_name: str, contents_path: str):
+        self._set_names(object_name, contents_path)
+        for step in self.steps:
+            contents = step.run(contents)
+        return contents
+
+    # Run all steps within an event loop (steps of I/O-bound stages are awaited in executor)
+    async def run_async(self, contents, object_name: str, contents_path: str, executor):
+        self._set_names(object_name, contents_path)
+        for step in self.steps:
+            if step.io_bound:
+                import asyncio  # (Already loaded by the running event loop)
+                contents = await asyncio.get_running_loop().run_in_executor(executor, step.run, contents)
+            else:
+                contents = step.run(contents)
+        return contents
+
+    def _set_names(self, object_name, contents_path):
+        for stage in self.stages:
+            stage.object_name = object_name
+            stage.contents_path = contents_path
+
+
+class _StageStep():
+    """ Remaining Hooks of One Stage. """
+
+    def __init__(self, stage, hooks: list):
+        self.stage = stage
+        self.hooks = hooks  # (phase, hook) tuples
+        self.io_bound = stage.io_bound
+
+    def run(self, contents):
+        if self.stage.profiler is None:
+            for phase, hook in self.hooks:
+                contents = hook(contents)
+        else:
+            for phase, hook in self.hooks:
+                contents = self.stage.profiler.measure(self.stage, phase, hook, contents, self.stage.pipeline_name)
+        return contents
+
+
+class _FusedStep():
+    """ Main Hooks of Adjacent Transforms, Applied to One Content after Another. """
+
+    def __init__(self):
+        self.hooks = []
+        self.io_bound = False
+
+    def add(self, stage):
+        self.hooks.append(stage._do_main)
+        self.io_bound = self.io_bound or stage.io_bound
+
+    def run(self, contents):
+        processed = []
+        for content in contents:
+            result = [content]
+            for hook in self.hooks:
+                result = hook(result)
+            processed.extend(result)
+        return processed
+
+
+# Check definition of pipeline before any file is read, e.g. {"stages": [{"FileJPEG": []}, ...], ...}
+# (direct is True if chunks are written directly into the image, see OnlineImageSampler)
+def validate_pipeline(pipeline: dict, file_type: str, direct: bool = False):
+    stages = pipeline.get("stages")
+    if not isinstance(stages, list) or len(stages) == 0:
+        raise Exception('%s-Pipeline needs a non-empty list of "stages".' % file_type)
+    stage_classes = []
+    for stage in stages:
+        if not isinstance(stage, dict) or len(stage) != 1 or not isinstance(list(stage.values())[0], list):
+            raise Exception('Each stage of %s-Pipeline needs to be defined as {"Name":[parameters]}, not %s.'
+                            % (file_type, stage))
+        stage_name, args = list(stage.items())[0]
+        stage_class = registry.stages.get(stage_name)
+        if stage_class.only_file_type is not None and stage_class.only_file_type != file_type:
+            raise Exception('"%s" only works on %s files, not in %s-Pipeline.'
+                            % (stage_name, stage_class.only_file_type, file_type))
+        if stage_class.direct and not direct:
+            raise Exception('"%s" in %s-Pipeline needs the sampler option "direct":[true].' % (stage_name, file_type))
+        if stage_class.direct and "workers" in pipeline:
+            raise Exception('"%s" in %s-Pipeline only works in pipelines that run as threads (not with "workers").'
+                            % (stage_name, file_type))
+        # Arguments are checked by creating the stage
+        try:
+            stage_class(args)
+        except Exception as error:
+            raise Exception('Invalid arguments %s of "%s" in %s-Pipeline: %s' % (args, stage_name, file_type, error))
+        stage_classes.append((stage_name, stage_class))
+
+    stage_name, stage_class = stage_classes[0]
+    if not stage_class.initiating:
+        raise Exception('%s-Pipeline has to start with a stage that reads in the file (e.g. "File"), not "%s".'
+                        % (file_type, stage_name))
+    split_by = None  # Name of first stage that splits the file
+    for stage_name, stage_class in stage_classes[1:]:
+        if stage_class.initiating:
+            raise Exception('"%s" can only be the first stage of %s-Pipeline.' % (stage_name, file_type))
+        if stage_class.whole_file and split_by is not None:
+            raise Exception('"%s" can\'t come after "%s" in %s-Pipeline since the file has already been split.'
+                            % (stage_name, split_by, file_type))
+        if stage_class.splitting and split_by is None:
+            split_by = stage_name
+    if not any(stage_class.sink for stage_name, stage_class in stage_classes):
+        raise Exception('%s-Pipeline has to end its processing in a stage that writes or sends the contents '
+                        '(e.g. "DiskImage"), otherwise they are lost.' % file_type)
@@ -1,19 +1,45 @@
 import os
-import glob
-import numpy
-from .core import Sampler, ChunksOfFile
-
+import json
+from .core import Sampler, ChunksOfFile, Chunk, get_original_filename
+from .ChunkStore import ChunkStore
+from .TruthMap import TruthMap
+from .Background import create_background
+from .VirtualImage import VirtualImage, VirtualImageServer
+from .registry import register_sampler
 
 """
 Definition of DiskImageSampler
 """
 
 
+@register_sampler
 class DiskImageSampler(Sampler):
     """  Concrete Implementation of Sampler Class for Generating Disk Images. """
 
-    def __init__(self, size: int, contents_path: str, image_path: str, merge_chunks: bool):
-        Sampler.__init__(self, size, contents_path, image_path, merge_chunks)
+    # Number of bytes written at once when image is streamed onto storage
+    BLOCK_SIZE = 64 * 2**20
+
+    def __init__(self, size: int, contents_path: str, image_path: str, merge_chunks: bool, stream: bool = False,
+                 seed: int = None, truth_map: str = "text", background: str = "random",
+                 background_source: str = None, serve: int = None, files: list = None):
+        Sampler.__init__(self, size, contents_path, image_path, merge_chunks, seed)
+        # Format of truth map ("text" or "binary")
+        if truth_map not in ("text", "binary"):
+            raise Exception('Format of truth map must be "text" or "binary".')
+        self.truth_map = truth_map
+        # Model of the bytes between the contents (e.g. "random", "zero", "pattern", "residue")
+        self.background = create_background(background, self.background_seed, background_source)
+        # Parameters that determine the image (written next to it, so it can be regenerated)
+        self.parameters = {"size": [size], "merge": [merge_chunks], "seed": [self.seed], "background": [background]}
+        if background_source is not None:
+            self.parameters["background_source"] = [background_source]
+        # If True, the image is written block by block onto storage instead of being built up in memory
+        # (a sparse background only saves storage when the image is streamed)
+        self.stream = stream or self.background.sparse
+        self.image_file = None
+        # If set, the image is not written but served as virtual image on this port of localhost
+        self.serve = serve
+        self.virtual_image = None
         self.image_path = os.path.join(self.image_path, "Disk Image")
         # Create "Disk Image" folder if it doesn't exist yet
         if not os.path.exists(self.image_path):
@@ -23,53 +49,110 @@ class DiskImageSampler(Sampler):
         #self.carving_image = bytearray()
         self.all_chunks = []
 
-        # Create empty truth map
-        with open(os.path.join(self.image_path, "truth_map.txt"), 'w') as truth_map:
-            columns = "{},\t{},\t{},\t{},\t{}\n\n".format("Number", "Size", "Chunk Offset", "File", "SHA-256 Hash")
-            truth_map.write(columns)
+        # Create empty truth map (a binary truth map is written at once)
+        if self.truth_map == "text":
+            with open(os.path.join(self.image_path, "truth_map.txt"), 'w') as truth_map:
+                truth_map.write(TruthMap.TEXT_HEADER)
 
-        # Obtain list of ChunkOfFile objects
-        self._obtain_files()
+        # Obtain list of ChunkOfFile objects (unless they have already been loaded, e.g. by a BatchSampler)
+        if files is None:
+            files = DiskImageSampler.load_files(self.contents_path)
+        self.files = list(files)  # Contents are shuffled in place, so a shared list is copied
 
-    # Obtain list of ChunkOfFile objects
-    # (stored chunks are read in automatically by ChunksOfFile constructor)
-    def _obtain_files(self):
-        current_path = os.getcwd()  # Save current path in order to go back later
-        os.chdir(self.contents_path)  # Go to contents directory
+    # Return list of ChunkOfFile objects out of the indexes of all chunk stores
+    # (chunks only know the location of their contents, which are not mapped in until they are written)
+    @staticmethod
+    def load_files(contents_path: str):
+        files = []
+        chunks_by_file = {}
+        for data_path, content_name, number, offset, length, chunk_hash, algorithm in ChunkStore.read_index(
+                contents_path):
+            chunk = Chunk()
+            chunk.set_location(data_path, offset, length)
+            chunk.set_pos_number(number)
+            # Truth map shows the filename, not the name under which the contents are stored
+            chunk.set_filename(get_original_filename(content_name))
+            chunk.set_sha256(TruthMap.format_hash(chunk_hash, algorithm))
+            chunks_by_file.setdefault(content_name, []).append(chunk)
 
-        # Remove number including underscore in filenames (e.g. abc.jpg_1 -> abc.jpg)
-        # (For each file there is at least one chunk with number 1)
-        for filename in glob.glob("*_1"):
-            filename = filename.split('_')
-            filename.pop()  # Remove number in filename
-            filename = '_'.join(filename)  # Merge elements again in case filename contained underscore
-            file = ChunksOfFile(filename)  # This obtains the chunks automatically
-            self.files.append(file)
+        for content_name in sorted(chunks_by_file):
+            chunks = sorted(chunks_by_file[content_name], key=lambda chunk: chunk.get_pos_number())
+            files.append(ChunksOfFile(get_original_filename(content_name), chunks))
+        return files
 
-        os.chdir(current_path)  # Go back to previous directory
-
-    # Generate disk image out of random bytes and spread chunks/files in it
+    # Generate disk image out of background and spread chunks/files in it
     def generate_image(self):
         # Check if sum of all chunks is larger than disk image's size
         self.reserved_size = sum(map(len, self.files))
         if self.reserved_size > self.size:
             # Delete empty truth map and "Disk Image" folder
-            os.unlink(os.path.join(self.image_path, "truth_map.txt"))
+            if self.truth_map == "text":
+                os.unlink(os.path.join(self.image_path, "truth_map.txt"))
             os.rmdir(self.image_path)
             raise Exception("Disk image too small for files. It must have at least %f MB."
                             % (self.reserved_size / 10**6))
-        # Generate random bytearray
         print("\n==== Generating Disk Image...")  # TRACING
-        self.carving_image = bytearray(numpy.random.bytes(self.size))
+        if self.serve is not None:
+            # Only the layout is computed, bytes of the image are computed when they are requested
+            chunks = self._place_contents()
+            if self.merge_chunks:
+                chunks = [chunk for content in chunks for chunk in content.get_chunks()]
+            self.virtual_image = VirtualImage(self.size, chunks, self.background)
+            self._write_parameters()
+            return
+        if self.stream:
+            with open(os.path.join(self.image_path, "disk_image.img"), 'wb') as self.image_file:
+                # Preallocate image and fill it with background block by block
+                self._fill_background()
+                # Distribute chunks/files randomly in disk image (they are written directly to their offsets)
+                self._distribute_contents()
+            self.image_file = None
+        else:
+            # Generate bytearray of background
+            self.carving_image = bytearray(self.background.get_block(0, self.size))
 
-        # Distribute chunks/files randomly in disk image
-        self._distribute_contents()
+            # Distribute chunks/files randomly in disk image
+            self._distribute_contents()
 
-        # Write disk image onto storage
-        with open(os.path.join(self.image_path, "disk_image.img"), 'wb') as image_file:
-            image_file.write(self.carving_image)
+            # Write disk image onto storage
+            with open(os.path.join(self.image_path, "disk_image.img"), 'wb') as image_file:
+                image_file.write(self.carving_image)
+        self._write_parameters()
         print("\n==== Disk Image has been written to", self.image_path)  # TRACING
 
+    # Serve virtual image via HTTP on localhost until the process is interrupted
+    def serve_image(self):
+        server = VirtualImageServer(self.virtual_image, self.serve)
+        print("\n==== Serving virtual Disk Image at http://127.0.0.1:%d/" % self.serve)  # TRACING
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    # Write parameters of image in format of "sampler" section of JSON file
+    # (together with the contents folder, they are enough to generate the same image again)
+    def _write_parameters(self):
+        with open(os.path.join(self.image_path, "parameters.json"), 'w') as parameters_file:
+            json.dump(self.parameters, parameters_file)
+
+    # Write background in blocks of fixed size to image file
+    def _fill_background(self):
+        self.image_file.truncate(self.size)
+        if self.background.sparse:
+            return  # Holes of the file are read as zeros
+        for position in range(0, self.size, self.BLOCK_SIZE):
+            self.image_file.write(self.background.get_block(position, min(self.BLOCK_SIZE, self.size - position)))
+
+    # Write chunk to its position in image
+    def _write_chunk(self, position, chunk):
+        if not self.stream:
+            Sampler._write_chunk(self, position, chunk)
+            return
+        self.image_file.seek(position)
+        self.image_file.write(chunk.get_content())
+
     def fill_truth_map(self):
         # Either chunks or files are the contents to write out
         if not self.merge_chunks:
@@ -78,6 +161,13 @@ class DiskImageSampler(Sampler):
             all_contents = self.files
         # Sort all contents (chunks or files) by offset
         all_contents.sort(key=lambda x: x.offset)
+        if self.truth_map == "binary":
+            # Chunks of a file lie one after another, so expanded chunks are still sorted by offset
+            if self.merge_chunks:
+                all_contents = [chunk for content in all_contents for chunk in content.get_chunks()]
+            TruthMap.write(os.path.join(self.image_path, "truth_map.bin"), all_contents)
+            print("\n==== Binary Truth Map has been written to", self.image_path)  # TRACING
+            return
         with open(os.path.join(self.image_path, "truth_map.txt"), 'a') as truth_map:
                 # Write out content information line by line
                 for content in all_contents:
@@ -1,13 +1,17 @@
-import magic
 import os
-from glob import iglob
+from fnmatch import fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from .core import Harvester, pipeline_by_file_type
+from .FileTypeDetector import detector
+from .registry import register_harvester
 
 """
 Concrete implementation of Harvester class
 """
 
 
+@register_harvester
 class FileHarvester(Harvester):
     """ Concrete Implementation of Harvester Class. """
 
@@ -17,6 +21,8 @@ class FileHarvester(Harvester):
         self.file_endings = ["*"]
         self.file_types = file_types
         self.recursive = True
+        self.num_threads = 8  # Number of threads that determine file types
+        self.batch_size = 32  # Maximum number of filenames put into a queue at once
 
     def reset(self):
         self.file_endings = ["*"]
@@ -27,6 +33,13 @@ class FileHarvester(Harvester):
     def set_recursive(self, recursive):
         self.recursive = recursive
 
+    # Setter for number of threads and batch size
+    def set_threads(self, num_threads):
+        self.num_threads = num_threads
+
+    def set_batch_size(self, batch_size):
+        self.batch_size = batch_size
+
     # Getter, Setter for path
     def get_path(self):
         return self.path
@@ -48,25 +61,103 @@ class FileHarvester(Harvester):
     def add_type(self, type):
         self.file_types.append(type)
 
-    # Collect all filenames and filter filenames that don't match a file ending in self.file_types
+    # Collect all filenames and filter filenames that don't match a file ending in self.file_types.
+    # If harvesting fails (e.g. a pipeline has exited while its queue is full), the other pipelines are ended.
     def run(self):
         print("Starting FileHarvester...")  # TRACING
+        try:
+            self._harvest()
+        except Exception as error:
+            # Exception is raised again by PipelineController once all pipelines have exited
+            self.error = error
+            for pipeline in pipeline_by_file_type.values():
+                try:
+                    pipeline.add_to_queue("/END/")
+                except Exception:
+                    pass  # (Pipeline has exited)
+        print("\nFileHarvester exiting...")  # TRACING
 
-        if self.recursive:
-            self.path = os.path.join(self.path, "**/")
-        for ext in self.file_endings:
-            for filename in iglob(os.path.join(self.path, ext), recursive=self.recursive):
-                with magic.Magic() as m:
-                    for tp in self.file_types:
-                        if m.id_filename(filename).startswith(tp):
-                            print("\nPutting '%s' in '%s' queue" % (filename.split('/')[-1], tp))  # TRACING
-                            # Insert tracked filename into appropriate pipeline queue
-                            pipeline_by_file_type[tp].add_to_queue(filename)
-                            self.crop.append(filename)  # Add tracked filename to crop
-                            break
+    def _harvest(self):
+        batches = {tp: [] for tp in self.file_types}  # Filenames that are not put into queues yet
+        for filename, description in self._detect_all():
+            self._collect(filename, description, batches)
 
         for file_type, pipeline in pipeline_by_file_type.items():
+            if batches.get(file_type):
+                pipeline.add_batch(batches[file_type])
             # "/END/" indicates that there are no more filenames to collect
             pipeline_by_file_type[file_type].add_to_queue("/END/")
 
-        print("\nFileHarvester exiting...")  # TRACING
+    # Return size of all files that are harvested (e.g. to spread contents over a direct image).
+    # Files are selected like in run(), but they are not passed on to the pipelines.
+    def get_expected_size(self):
+        size = 0
+        for filename, description in self._detect_all():
+            if description is not None and detector.match(description, self.file_types) is not None:
+                try:
+                    size += os.path.getsize(filename)
+                except OSError:
+                    pass
+        return size
+
+    # Yield (filename, description of file type) of all files in path in order
+    # (types are determined by a pool of threads)
+    def _detect_all(self):
+        pending = deque()  # Files whose types are being determined
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            for filename in self._scan(self.path):
+                pending.append(executor.submit(self._detect, filename))
+                # Limit number of files whose types are determined at the same time
+                if len(pending) >= 4 * self.num_threads:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    # Yield filenames of all regular files in path that match a file ending (hidden files are skipped)
+    def _scan(self, path):
+        directories = [path]
+        while directories:
+            try:
+                entries = os.scandir(directories.pop())
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            directories.append(entry.path)
+                    elif entry.is_file() and entry.path not in self.excluded:
+                        for ext in self.file_endings:
+                            if fnmatch(entry.name, ext):
+                                yield entry.path
+                                break
+
+    # Determine type of file by reading only its first bytes (runs in thread pool)
+    @staticmethod
+    def _detect(filename):
+        try:
+            with open(filename, mode='rb') as file:
+                header = file.read(detector.HEADER_SIZE)
+        except OSError:
+            return filename, None
+        return filename, detector.id_buffer(header)
+
+    # Add file to batch of its pipeline and put batch into queue if it is full or the pipeline is idle
+    def _collect(self, filename, description, batches):
+        if description is None:
+            return
+        tp = detector.match(description, self.file_types)
+        if tp is None:
+            return
+        print("\nPutting '%s' in '%s' queue" % (filename.split('/')[-1], tp))  # TRACING
+        # Detected type is passed on so that the pipeline doesn't need to determine it again
+        batches[tp].append((filename, description))
+        self.crop.append(filename)  # Add tracked filename to crop
+        self.crop_types[filename] = tp
+        pipeline = pipeline_by_file_type[tp]
+        if len(batches[tp]) >= self.batch_size or pipeline.queue.empty():
+            # Insert tracked filenames into appropriate pipeline queue
+            pipeline.add_batch(batches[tp])
+            batches[tp] = []
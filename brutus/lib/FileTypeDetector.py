@@ -0,0 +1,45 @@
+import os
+import threading
+
+"""
+Definition of FileTypeDetector
+"""
+
+
+class FileTypeDetector():
+    """ Thread-Safe Detection of File Types by libmagic.
+    Loading the Magic Database Is Expensive, so Each Thread Keeps One Cached Handle. """
+
+    # Number of bytes at the beginning of a buffer that are needed to identify its type
+    HEADER_SIZE = 2**16
+
+    def __init__(self):
+        self.local = threading.local()  # Handle of each thread
+
+    # Return description of file type for file (e.g. "JPEG image data, JFIF standard 1.01, ...")
+    def id_filename(self, filename: str):
+        return self._get_handle().id_filename(filename)
+
+    # Return description of file type for already read-in content
+    def id_buffer(self, buffer):
+        return self._get_handle().id_buffer(bytes(buffer[:self.HEADER_SIZE]))
+
+    # Return first of the file types the description starts with, otherwise None
+    @staticmethod
+    def match(description: str, file_types: list):
+        for file_type in file_types:
+            if description.startswith(file_type):
+                return file_type
+        return None
+
+    # Return cached libmagic handle of current thread (a forked process creates its own handle)
+    def _get_handle(self):
+        if getattr(self.local, "pid", None) != os.getpid():
+            import magic  # Imported on first use, libmagic is only loaded by processes that detect file types
+            self.local.handle = magic.Magic()
+            self.local.pid = os.getpid()
+        return self.local.handle
+
+
+# Detector shared by all components of a process
+detector = FileTypeDetector()
@@ -3,13 +3,17 @@ import json
 import os
 import hashlib
 from .PipelineController import PipelineController
-# Need to know each possible subclass of Harvester and Sampler for dynamic creation
-from .FileHarvester import FileHarvester
-from .DiskImageSampler import DiskImageSampler
+from .Manifest import Manifest
+from .ChunkStore import ChunkStore
+from .core import get_content_name
+from .BatchSampler import BatchSampler
+# Harvester and Sampler classes are looked up by name (and imported on first use)
+from . import registry
 
 """
-The Initiate class checks if a session of pipeline processing has already run, reads config file in
-and passes its parameters to the components (Harvester, PipelineController, Sampler), respectively.
+The Initiate class reads config file in, checks which files have changed since a previous session of
+pipeline processing and passes its parameters to the components (Harvester, PipelineController, Sampler),
+respectively. Only new or changed files are processed again.
 """
 
 
@@ -39,10 +43,20 @@ class Initiate():
         self.file_types = None
         self.pipelines = None
         self.sampler_arguments = None
+        self.profiling = None
+        self.scheduler = None
         # Read parameters of JSON file
         self._read_config()
-        # Check if session has already run and start new session if false
-        if not self._has_session_run():
+        # Manifest of files processed in previous sessions
+        self.manifest = None
+        self.unchanged_files = set()
+        # Sampler that writes chunks directly into the image while pipelines are running
+        self.online_sampler = None
+        if self.sampler_arguments.get("direct", [False])[0]:
+            # Contents are not stored, so all files are processed
+            self._start_direct_session()
+        # Check if session has already run and start new session for new or changed files
+        elif not self._has_session_run():
             self._start_session()
 
     # Define Sampler and create image as well as truth map
@@ -50,12 +64,58 @@ class Initiate():
         image_size = self.sampler_arguments["size"][0]
         # Boolean value whether file chunks are supposed to be merged in image or not
         merge_chunks = self.sampler_arguments["merge"][0]
+        # Further optional parameters are passed as keyword arguments (e.g. "stream":[true] -> stream=True)
+        options = {key: value[0] for key, value in self.sampler_arguments.items()
+                   if key not in ("size", "merge", "variants", "workers", "direct")}
+        if self.online_sampler is not None:
+            # Chunks have already been written, only gaps of image and truth map are left
+            self.online_sampler.generate_image()
+            self.online_sampler.fill_truth_map()
+            return
         # Get ABCMeta class that represents the Sampler
-        sampler_class = globals()[self.sampler_name]
+        sampler_class = registry.samplers.get(self.sampler_name)
+        if "variants" in self.sampler_arguments:
+            self._start_batch_sampler(sampler_class, image_size, merge_chunks, options)
+            return
         # Create instance of Sampler class
-        sampler = sampler_class(image_size, self.contents_path, self.image_path, merge_chunks)
+        sampler = sampler_class(image_size, self.contents_path, self.image_path, merge_chunks, **options)
         sampler.generate_image()
         sampler.fill_truth_map()
+        if options.get("serve") is not None:
+            # Virtual image is served until the process is interrupted
+            sampler.serve_image()
+
+    # Generate several variants of the image out of the same contents.
+    # Variants are either a number (e.g. "variants":[100], each variant gets its own seed)
+    # or a list of parameters that override the sampler parameters (e.g. "variants":[{"seed":[1], "size":[20]}]).
+    def _start_batch_sampler(self, sampler_class, image_size, merge_chunks, options):
+        variants = []
+        definitions = self.sampler_arguments["variants"]
+        if len(definitions) == 1 and isinstance(definitions[0], int):
+            # Without a seed (None, unlike a seed of 0), a random base seed is drawn
+            base_seed = options.get("seed")
+            if base_seed is None:
+                import numpy  # (Only needed to draw a seed)
+                base_seed = numpy.random.SeedSequence().entropy
+            definitions = [{"seed": [base_seed + i]} for i in range(definitions[0])]
+            # Base seed is written next to the variants, so the whole batch can be generated again
+            os.makedirs(self.image_path, exist_ok=True)
+            with open(os.path.join(self.image_path, "parameters.json"), 'w') as parameters_file:
+                json.dump(dict(self.sampler_arguments, seed=[base_seed]), parameters_file)
+        for definition in definitions:
+            variant_options = dict(options)
+            variant_options.update({key: value[0] for key, value in definition.items()
+                                    if key not in ("size", "merge")})
+            variants.append((definition.get("size", [image_size])[0], definition.get("merge", [merge_chunks])[0],
+                             variant_options))
+        # Number of worker processes (0 means one worker per CPU core)
+        num_workers = self.sampler_arguments.get("workers", [1])[0]
+        if num_workers == 0:
+            num_workers = os.cpu_count() or 1
+        elif num_workers < 0:
+            raise Exception('Number of "workers" must not be negative.')
+        batch_sampler = BatchSampler(sampler_class, self.contents_path, self.image_path, variants, num_workers)
+        batch_sampler.generate_images()
 
     # Read parameters of JSON file
     def _read_config(self):
@@ -64,37 +124,77 @@ class Initiate():
             self.file_types = all_config["harvester"]
             self.pipelines = all_config["pipelines"]
             self.sampler_arguments = all_config["sampler"]
+            # Optional paths of profiling report and trace file
+            self.profiling = all_config.get("profiling")
+            # Optional shared worker pool for all pipelines (work stealing)
+            self.scheduler = all_config.get("scheduler")
+            # Optional modules of third-party components (e.g. ["mypackage.stages"])
+            registry.load_plugins(all_config.get("plugins", []))
 
-    # Return True if session has already run, otherwise False
+    # Return True if session has already run for all current files, otherwise False
     def _has_session_run(self):
-        all_files = []
-        # Parse directory tree recursively and hash files to check any modification
-        for root, subdirs, files in os.walk(self.harvest_path):
-            all_files.extend(files)
-        # Sort filenames so that list of same elements always stays the same
-        all_files.sort()
-        # Concatenate sorted filenames
-        all_files = "".join(all_files)
-        # Read in content of JSON file
-        with open(self.json_file, 'r') as file:
-            content_json = file.read()
-        hashed_file_list = hashlib.sha256(bytes(all_files, "utf-8")).hexdigest()  # Hash of file list
-        hashed_JSON_content = hashlib.sha256(bytes(content_json, "utf-8")).hexdigest()  # Hash of JSON content
-        # Name of "contents folder" is truncated hash of file list and truncated hash of JSON content
-        self.contents_path = os.path.join(os.getcwd(), str(hashed_file_list)[:10] + '_' + str(hashed_JSON_content)[:10])
-        # Check if session has already run (if folder exists), otherwise create new folder in current path
+        source_path = os.path.abspath(self.harvest_path)
+        hashed_source = hashlib.sha256(bytes(source_path, "utf-8")).hexdigest()  # Hash of source path
+        # Name of "contents folder" is truncated hash of source path
+        self.contents_path = os.path.join(os.path.abspath(self.contents_path), "contents_" + hashed_source[:10])
         if not os.path.exists(self.contents_path):
             os.makedirs(self.contents_path)
-            return False
-        print("Session has already run.")
-        return True
+
+        self.manifest = Manifest(os.path.join(self.contents_path, "manifest.json"), self.file_types, self.pipelines)
+        self.unchanged_files, outdated_files = self.manifest.compare(source_path)
+        if not self.manifest.is_current:
+            # Contents of unknown or older layout can't be reused
+            ChunkStore.clear(self.contents_path)
+        # Hashes of files of an interrupted session are not reliable
+        ChunkStore.clear_files(self.contents_path)
+        # Delete contents of files that have been changed or deleted
+        # (also leftovers of new files from an interrupted session)
+        ChunkStore.remove(self.contents_path, {get_content_name(filename) for filename in outdated_files})
+        if len(outdated_files) == 0:
+            print("Session has already run.")
+            return True
+        print("%d files are unchanged, %d files are new or changed."
+              % (len(self.unchanged_files), len(outdated_files)))  # TRACING
+        return False
+
+    # Run pipelines while the OnlineImageSampler places their chunks (see DirectImage stage)
+    def _start_direct_session(self):
+        self.contents_path = os.path.abspath(self.contents_path)
+        options = {key: value[0] for key, value in self.sampler_arguments.items()
+                   if key not in ("size", "merge", "variants", "workers", "direct")}
+        harvester_class = registry.harvesters.get(self.harvester_name)
+        harvester = harvester_class(self.harvest_path, self.file_types)
+        # Size of all files that are harvested is the estimate of the size of all contents
+        expected_size = harvester.get_expected_size()
+        sampler_class = registry.samplers.get("OnlineImageSampler")
+        self.online_sampler = sampler_class(self.sampler_arguments["size"][0], self.contents_path,
+                                            self.image_path, self.sampler_arguments["merge"][0], expected_size,
+                                            **options)
+        pipe_controller = PipelineController(harvester, self.file_types, self.pipelines, self.contents_path,
+                                             self.profiling, self.scheduler, direct=True)
+        pipe_controller.start_all_pipelines()
 
     def _start_session(self):
         # Get ABCMeta class that represents the Harvester
-        harvester_class = globals()[self.harvester_name]
+        harvester_class = registry.harvesters.get(self.harvester_name)
         # Create instance of Harvester class
         harvester = harvester_class(self.harvest_path, self.file_types)
+        # Files that have been processed in a previous session are skipped
+        harvester.set_excluded(self.unchanged_files)
         # Set PipelineController
-        pipe_controller = PipelineController(harvester, self.file_types, self.pipelines, self.contents_path)
+        pipe_controller = PipelineController(harvester, self.file_types, self.pipelines, self.contents_path,
+                                             self.profiling, self.scheduler)
         # Start all pipelines with their stages
         pipe_controller.start_all_pipelines()
+
+        # Update manifest with all files of this session (files that have not been harvested have no type).
+        # Hashes of processed files have been recorded by the pipelines while they read the files.
+        crop_types = harvester.get_crop_types()
+        file_hashes = ChunkStore.read_files(self.contents_path)
+        for root, subdirs, files in os.walk(os.path.abspath(self.harvest_path)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if path not in self.unchanged_files:
+                    self.manifest.add(path, crop_types.get(path), file_hashes.get(path))
+        self.manifest.save()
+        ChunkStore.clear_files(self.contents_path)
@@ -0,0 +1,111 @@
+import os
+import json
+import hashlib
+
+"""
+Definition of Manifest
+"""
+
+
+class Manifest():
+    """ Persistent Record of All Files Processed in Previous Sessions.
+    Each File Is Identified by Its Path, Size, Modification Time and Content Hash.
+    Each File Type Is Identified by a Hash of Its Pipeline Definition. """
+
+    # Version of the contents folder layout (contents of older versions are processed again)
+    VERSION = 3
+
+    def __init__(self, manifest_path: str, file_types: list, pipelines: list):
+        self.manifest_path = manifest_path
+        self.file_types = file_types
+        # Hash of stage definitions for each file type
+        self.pipeline_hashes = {}
+        for file_type, pipeline in zip(file_types, pipelines):
+            definition = json.dumps(pipeline["stages"], sort_keys=True)
+            self.pipeline_hashes[file_type] = hashlib.sha256(bytes(definition, "utf-8")).hexdigest()
+
+        self.files = {}  # Entries of all files by path
+        self.previous_file_types = []  # File types that were harvested in previous session
+        # False if contents folder has no manifest or has been written in an older layout
+        self.is_current = False
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest["version"] == self.VERSION:
+                self.files = manifest["files"]
+                self.previous_file_types = manifest["file_types"]
+                self.is_current = True
+
+    # Compare files in source path with entries of manifest.
+    # Returns set of unchanged files and list of files whose contents are outdated.
+    def compare(self, source_path: str):
+        unchanged = set()
+        outdated = []
+        existing = set()
+        for root, subdirs, files in os.walk(source_path):
+            for filename in files:
+                path = os.path.join(root, filename)
+                existing.add(path)
+                if self._is_unchanged(path):
+                    unchanged.add(path)
+                else:
+                    outdated.append(path)
+
+        # Files that have been deleted since the previous session
+        for path in list(self.files):
+            if path not in existing:
+                outdated.append(path)
+                del self.files[path]
+
+        return unchanged, outdated
+
+    # Add entry of processed file (file type is None if file has not been harvested).
+    # File hash is the SHA-256 hash (hex) computed while the file was read in by its pipeline,
+    # a harvested file without hash has not been processed completely and is processed again next session.
+    def add(self, path: str, file_type: str, file_hash: str = None):
+        if file_type is not None and file_hash is None:
+            self.files.pop(path, None)
+            return
+        stat = os.stat(path)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "file_type": file_type,
+                 "sha256": file_hash, "pipeline": None}
+        if file_type is not None:
+            entry["pipeline"] = self.pipeline_hashes[file_type]
+        self.files[path] = entry
+
+    # Write manifest onto storage
+    def save(self):
+        manifest = {"version": self.VERSION, "file_types": self.file_types, "files": self.files}
+        with open(self.manifest_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+
+    # Return True if file and its pipeline definition have not changed since previous session
+    def _is_unchanged(self, path):
+        entry = self.files.get(path)
+        if entry is None:
+            return False
+        if entry["file_type"] is None:
+            # File has not been harvested, but it might be harvested if file types have changed
+            if self.previous_file_types != self.file_types:
+                return False
+        elif entry["pipeline"] != self.pipeline_hashes.get(entry["file_type"]):
+            return False
+
+        stat = os.stat(path)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns != entry["mtime"]:
+            # Modification time is not reliable enough, so compare content hash
+            if entry["sha256"] is None or self._hash_file(path) != entry["sha256"]:
+                return False
+            entry["mtime"] = stat.st_mtime_ns
+        return True
+
+    # Return SHA-256 hash of file content
+    @staticmethod
+    def _hash_file(path):
+        file_hash = hashlib.sha256()
+        with open(path, mode='rb') as file:
+            for block in iter(lambda: file.read(2**20), b''):
+                file_hash.update(block)
+        return file_hash.hexdigest()
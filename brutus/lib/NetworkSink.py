@@ -0,0 +1,290 @@
+import os
+import time
+import socket
+import struct
+import threading
+import socketserver
+from collections import deque
+
+"""
+Definition of TCPSender, UDPSender, TCPReceiver and UDPReceiver
+"""
+
+
+# Frame of a chunk sent over TCP: length of content name, chunk number, length of chunk,
+# hash algorithm (see ChunkHasher.ALGORITHMS, 0 means no hash), length of hash
+# (followed by content name, hash and chunk)
+FRAME = struct.Struct("!HIIBB")
+# Record of a piece of a chunk sent over UDP: length of content name, chunk number, offset of piece in chunk,
+# length of chunk, length of piece, hash algorithm, length of hash (followed by content name, hash and piece).
+# Only the first piece of a chunk carries its hash. A datagram holds one or more records.
+RECORD = struct.Struct("!HIIIHBB")
+
+# Senders shared by all stages of a process by (protocol, host, port)
+_senders = {}
+_senders_lock = threading.Lock()
+
+
+# Return shared sender for destination and register one more user of it
+def acquire_sender(sender_class, host: str, port: int, *args):
+    key = (sender_class.__name__, host, port, os.getpid())
+    with _senders_lock:
+        if key not in _senders:
+            _senders[key] = sender_class(host, port, *args)
+        sender = _senders[key]
+        sender.users += 1
+        return sender
+
+
+# Unregister user of sender. The last user flushes and closes the sender.
+def release_sender(sender):
+    with _senders_lock:
+        sender.users -= 1
+        if sender.users > 0:
+            sender.flush()
+            return
+        for key, value in list(_senders.items()):
+            if value is sender:
+                del _senders[key]
+    sender.close()
+
+
+class _Sender():
+    """ Bounded Send Buffer Emptied by Background Threads.
+    A Full Buffer Blocks the Sending Stage (Backpressure). """
+
+    def __init__(self, buffer_size: int, num_threads: int):
+        self.buffer_size = buffer_size  # Maximum number of buffered bytes
+        self.buffered = 0
+        self.frames = deque()  # Frames (list of buffers) waiting to be sent
+        self.condition = threading.Condition()
+        self.pending = 0  # Frames that have been taken out of buffer but not been sent yet
+        self.closed = False
+        self.error = None  # Exception of a sending thread, raised in the sending stage
+        self.users = 0
+        self.threads = [threading.Thread(target=self._run, args=(i,), daemon=True) for i in range(num_threads)]
+        for thread in self.threads:
+            thread.start()
+
+    # Queue chunk of content for sending (with its hash if SaveHashes has hashed it)
+    def send(self, content_name: str, number: int, content, chunk_hash: bytes = b'', algorithm: int = 0):
+        frame = self._frame(content_name.encode("utf-8", "surrogateescape"), number, memoryview(content),
+                            chunk_hash, algorithm)
+        size = sum(map(len, frame))
+        with self.condition:
+            # A single frame larger than the buffer is accepted if the buffer is empty
+            while self.buffered > 0 and self.buffered + size > self.buffer_size and self.error is None:
+                self.condition.wait()
+            self._raise_error()
+            self.frames.append(frame)
+            self.buffered += size
+            self.condition.notify_all()
+
+    # Wait until all queued frames have been sent
+    def flush(self):
+        with self.condition:
+            while (self.frames or self.pending) and self.error is None:
+                self.condition.wait()
+            self._raise_error()
+
+    def close(self):
+        self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    # Send frames out of buffer until sender is closed
+    def _run(self, number):
+        while True:
+            with self.condition:
+                while not self.frames and not self.closed:
+                    self.condition.wait()
+                if not self.frames:
+                    return
+                batch = self._take_batch()
+                self.pending += 1
+            try:
+                self._transmit(number, batch)
+            except OSError as error:
+                with self.condition:
+                    self.error = error
+            with self.condition:
+                self.pending -= 1
+                self.buffered -= sum(len(buffer) for frame in batch for buffer in frame)
+                self.condition.notify_all()
+
+    # Take frames out of buffer (called with condition held)
+    def _take_batch(self):
+        return [self.frames.popleft()]
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise Exception("Sending contents failed: %s" % self.error)
+
+    # Return frame of chunk as list of buffers
+    def _frame(self, name, number, content, chunk_hash, algorithm):
+        return [FRAME.pack(len(name), number, len(content), algorithm, len(chunk_hash)) + name + chunk_hash, content]
+
+    # Send batch of frames over connection number
+    def _transmit(self, number, batch):
+        return
+
+
+class TCPSender(_Sender):
+    """ Pool of Persistent TCP Connections to One Destination.
+    Chunks Are Sent as Length-Prefixed Frames, Small Frames Are Batched into Large Writes. """
+
+    def __init__(self, host: str, port: int, connections: int = 2, batch_size: int = 2**18,
+                 buffer_size: int = 2**24):
+        self.batch_size = batch_size  # Frames are collected until a write has at least this size
+        # Each sending thread owns one connection
+        self.sockets = []
+        for i in range(connections):
+            connection = socket.create_connection((host, port))
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sockets.append(connection)
+        _Sender.__init__(self, buffer_size, connections)
+
+    def close(self):
+        _Sender.close(self)
+        for connection in self.sockets:
+            connection.close()
+
+    def _take_batch(self):
+        batch = [self.frames.popleft()]
+        size = sum(map(len, batch[0]))
+        while self.frames and size < self.batch_size:
+            size += sum(map(len, self.frames[0]))
+            batch.append(self.frames.popleft())
+        return batch
+
+    def _transmit(self, number, batch):
+        buffers = [buffer for frame in batch for buffer in frame]
+        if sum(map(len, buffers)) < self.batch_size:
+            # Small frames are copied into one write
+            self.sockets[number].sendall(b''.join(buffers))
+        else:
+            for buffer in buffers:
+                self.sockets[number].sendall(buffer)
+
+
+class UDPSender(_Sender):
+    """ Sends Chunks as Datagrams of a Maximum Size to One Destination.
+    Chunks Are Split into Pieces, Small Pieces Share a Datagram. An Optional Rate Paces the Sending. """
+
+    def __init__(self, host: str, port: int, datagram_size: int = 1400, rate: float = 0,
+                 buffer_size: int = 2**24):
+        if datagram_size <= RECORD.size or datagram_size > 65507:
+            raise Exception("Datagram size must be between %d and 65507 bytes." % (RECORD.size + 1))
+        self.address = (host, port)
+        self.datagram_size = datagram_size
+        self.rate = rate * 10**6  # Maximum bytes per second (0 means unlimited)
+        self.sent = 0  # Bytes sent since start of pacing
+        self.pacing_start = None
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        _Sender.__init__(self, buffer_size, 1)
+
+    def close(self):
+        _Sender.close(self)
+        self.socket.close()
+
+    # Return datagrams of chunk
+    def _frame(self, name, number, content, chunk_hash, algorithm):
+        datagrams = []
+        if self.datagram_size - RECORD.size - len(name) - len(chunk_hash) <= 0:
+            raise Exception("Content name %s is too long for datagrams of %d bytes." % (name, self.datagram_size))
+        # (An empty chunk is sent as one empty piece)
+        offset = 0
+        while offset == 0 or offset < len(content):
+            piece = content[offset:offset + self.datagram_size - RECORD.size - len(name) - len(chunk_hash)]
+            datagrams.append(RECORD.pack(len(name), number, offset, len(content), len(piece), algorithm,
+                                         len(chunk_hash)) + name + chunk_hash + piece)
+            offset += len(piece)
+            # Following pieces don't carry the hash
+            chunk_hash, algorithm = b'', 0
+        return datagrams
+
+    def _take_batch(self):
+        # Datagrams of several small chunks are merged as long as they fit into one datagram
+        batch = [self.frames.popleft()]
+        while self.frames and len(self.frames[0]) == 1 and len(batch[-1]) == 1 \
+                and len(batch[-1][0]) + len(self.frames[0][0]) <= self.datagram_size:
+            batch[-1] = [batch[-1][0] + self.frames.popleft()[0]]
+        return batch
+
+    def _transmit(self, number, batch):
+        for frame in batch:
+            for datagram in frame:
+                self._pace(len(datagram))
+                self.socket.sendto(datagram, self.address)
+
+    # Wait until sending of size bytes keeps the rate
+    def _pace(self, size):
+        if self.rate <= 0:
+            return
+        if self.pacing_start is None:
+            self.pacing_start = time.perf_counter()
+        self.sent += size
+        delay = self.sent / self.rate - (time.perf_counter() - self.pacing_start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class TCPReceiver(socketserver.ThreadingTCPServer):
+    """ Receives Frames of TCPSender (e.g. for Tests on Localhost).
+    Each Received Chunk Is Passed to a Callback as (Content Name, Chunk Number, Chunk, Hash, Hash Algorithm). """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int, callback, host: str = "127.0.0.1"):
+        self.callback = callback
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), _FrameHandler)
+
+
+class _FrameHandler(socketserver.StreamRequestHandler):
+    """ Reads Length-Prefixed Frames out of a TCP Connection. """
+
+    def handle(self):
+        while True:
+            header = self.rfile.read(FRAME.size)
+            if len(header) < FRAME.size:
+                return  # Connection has been closed
+            name_length, number, length, algorithm, hash_length = FRAME.unpack(header)
+            name = self.rfile.read(name_length).decode("utf-8", "surrogateescape")
+            chunk_hash = self.rfile.read(hash_length)
+            self.server.callback(name, number, self.rfile.read(length), chunk_hash, algorithm)
+
+
+class UDPReceiver(socketserver.UDPServer):
+    """ Receives Datagrams of UDPSender (e.g. for Tests on Localhost).
+    Each Received Piece Is Passed to a Callback as (Content Name, Chunk Number, Offset, Chunk Length, Piece,
+    Hash, Hash Algorithm). Only the First Piece of a Chunk Has a Hash. """
+
+    allow_reuse_address = True
+    max_packet_size = 65507
+
+    def __init__(self, port: int, callback, host: str = "127.0.0.1"):
+        self.callback = callback
+        socketserver.UDPServer.__init__(self, (host, port), _DatagramHandler)
+
+
+class _DatagramHandler(socketserver.BaseRequestHandler):
+    """ Splits a Datagram into Its Records. """
+
+    def handle(self):
+        datagram = self.request[0]
+        position = 0
+        while position + RECORD.size <= len(datagram):
+            name_length, number, offset, length, piece_length, algorithm, hash_length = \
+                RECORD.unpack_from(datagram, position)
+            position += RECORD.size
+            name = datagram[position:position + name_length].decode("utf-8", "surrogateescape")
+            position += name_length
+            chunk_hash = datagram[position:position + hash_length]
+            position += hash_length
+            self.server.callback(name, number, offset, length, datagram[position:position + piece_length],
+                                 chunk_hash, algorithm)
+            position += piece_length
@@ -0,0 +1,188 @@
+import os
+import bisect
+import threading
+import numpy
+from .core import ChunksOfFile, Chunk, get_original_filename
+from .TruthMap import TruthMap
+from .DiskImageSampler import DiskImageSampler
+from .registry import register_sampler
+
+"""
+Definition of OnlineImageSampler
+"""
+
+
+@register_sampler
+class OnlineImageSampler(DiskImageSampler):
+    """ Sampler That Places Chunks While the Pipelines Are Still Running.
+    The DirectImage Stage Hands Chunks to This Sampler, Which Writes Them into the Image Right Away.
+    Contents Are Laid Out One After Another, Separated by Random Gaps. Single Chunks Wait in a Window and Are
+    Laid Out in Random Order, so Chunks of Different Files Are Interleaved (Merged Files Are Laid Out in the Order
+    They Arrive).
+    The Gaps Share the Space That Is Left over by the Expected Size of All Contents, so Contents Are Spread
+    over the Whole Image without Fragmenting It (a Late Large File Always Fits as Long as the Estimate Holds).
+    If the Estimate Has Been Too Large, the Contents Are Moved Apart at the End to Spread the Space That Is Left.
+    The Background Is Filled into the Gaps at the End. This Way, Chunks Are Neither Written to nor Read from
+    a Contents Folder. """
+
+    # Sampler that DirectImage stages hand their chunks to
+    current = None
+    # Maximum number of chunks and bytes that wait in window before they are laid out
+    WINDOW_CHUNKS = 1024
+    WINDOW_SIZE = 2**26
+    # Share of image that may stay unused at its end (because less contents arrived than expected)
+    # before the contents are spread again
+    RESPREAD_SHARE = 0.01
+
+    def __init__(self, size: int, contents_path: str, image_path: str, merge_chunks: bool, expected_size: int = 0,
+                 **options):
+        DiskImageSampler.__init__(self, size, contents_path, image_path, merge_chunks, files=[], **options)
+        if self.serve is not None:
+            raise Exception('A direct image can\'t be served as virtual image.')
+        self.pid = os.getpid()  # Chunks can only be placed by threads of this process
+        self.lock = threading.Lock()
+        self.rng = numpy.random.default_rng(self.layout_seed)
+        # Reserved slots in order of their position (end is exclusive)
+        self.starts = []
+        self.ends = []
+        self.cursor = 0  # End of last reserved slot
+        # Expected number of content bytes that have not arrived yet (e.g. size of all source files)
+        self.expected_size = min(expected_size, self.size)
+        # Bytes of image that are left for gaps
+        self.gap_budget = self.size - self.expected_size
+        # Chunks (content name, number, content, hash) that have not been laid out yet and their size in bytes
+        self.window = []
+        self.window_size = 0
+        self.image_filename = os.path.join(self.image_path, "disk_image.img")
+        self.image_file = open(self.image_filename, 'w+b')  # (Contents are read again if they are spread)
+        self.image_file.truncate(self.size)
+        OnlineImageSampler.current = self
+
+    # Reserve slot for contents and write them to image.
+    # If chunks are merged, contents are the chunks of one file and are placed one after another.
+    # Hashes are (hash, algorithm) of each content.
+    def place(self, content_name: str, first_number: int, contents: list, hashes: list):
+        items = [(content_name, first_number + i, content, hashes[i]) for i, content in enumerate(contents)]
+        if self.merge_chunks:
+            with self.lock:
+                position = self._reserve(sum(len(content) for content in contents))
+            chunks = self._write(position, items)
+            with self.lock:
+                self.files.append(ChunksOfFile(get_original_filename(content_name), chunks))
+            return
+        # Chunks leave the window in random order as soon as it is full
+        placed = []
+        with self.lock:
+            for item in items:
+                self.window.append(item)
+                self.window_size += len(item[2])
+            while len(self.window) > self.WINDOW_CHUNKS or self.window_size > self.WINDOW_SIZE:
+                placed.append(self._take_random())
+        self._write_chunks(placed)
+
+    # Write chunks to their positions (each (position, item)) and add them to all chunks
+    def _write_chunks(self, placed):
+        chunks = []
+        for position, item in placed:
+            chunks.extend(self._write(position, [item]))
+        with self.lock:
+            self.all_chunks.extend(chunks)
+
+    # Write items one after another from position on and return their chunks
+    def _write(self, position, items):
+        chunks = []
+        for content_name, number, content, chunk_hash in items:
+            os.pwrite(self.image_file.fileno(), content, position)
+            chunk = Chunk()
+            # Content of chunk is only kept in image
+            chunk.set_location(self.image_filename, position, len(content))
+            chunk.set_offset(position)
+            chunk.set_pos_number(number)
+            chunk.set_filename(get_original_filename(content_name))
+            chunk.set_sha256(TruthMap.format_hash(*chunk_hash))
+            chunks.append(chunk)
+            position += len(content)
+        return chunks
+
+    # Take random chunk out of window and reserve slot for it (called with lock held)
+    def _take_random(self):
+        i = int(self.rng.integers(len(self.window)))
+        self.window[i], self.window[-1] = self.window[-1], self.window[i]
+        item = self.window.pop()
+        self.window_size -= len(item[2])
+        return self._reserve(len(item[2])), item
+
+    # Fill gaps between chunks with background and close image
+    def generate_image(self):
+        # Chunks left in window are laid out in random order
+        with self.lock:
+            placed = [self._take_random() for i in range(len(self.window))]
+        self._write_chunks(placed)
+        # Gaps are filled with background up to this position (a sparse background is only written
+        # where contents have been moved away)
+        fill_end = self.size
+        if self.background.sparse:
+            fill_end = 0
+        if self.expected_size > self.RESPREAD_SHARE * self.size and self.starts:
+            if self.background.sparse:
+                fill_end = self.cursor
+            self._spread_contents()
+        print("\n==== Filling gaps of Disk Image...")  # TRACING
+        self.reserved_size = sum(end - start for start, end in zip(self.starts, self.ends))
+        position = 0
+        for start, end in zip(self.starts + [self.size], self.ends + [self.size]):
+            # Gap from position to start
+            for block_start in range(position, min(start, fill_end), self.BLOCK_SIZE):
+                length = min(self.BLOCK_SIZE, min(start, fill_end) - block_start)
+                os.pwrite(self.image_file.fileno(), self.background.get_block(block_start, length), block_start)
+            position = end
+        self.image_file.close()
+        self.image_file = None
+        OnlineImageSampler.current = None
+        self._write_parameters()
+        print("\n==== Disk Image has been written to", self.image_path)  # TRACING
+
+    # Write parameters of image (its seed doesn't regenerate the image, since the layout depends on the order in
+    # which chunks arrive from the pipelines)
+    def _write_parameters(self):
+        self.parameters["direct"] = [True]
+        DiskImageSampler._write_parameters(self)
+
+    # Spread space left at the end of the image over the gaps in proportion to the lengths of the contents
+    # and move the contents (and their chunks) to their new positions
+    def _spread_contents(self):
+        lengths = numpy.array([end - start for start, end in zip(self.starts, self.ends)] + [0], dtype=float)
+        lengths[-1] = lengths.mean()  # (Share of space that stays at the end)
+        shares = self.rng.multinomial(self.size - self.cursor, lengths / lengths.sum())
+        shifts = numpy.cumsum(shares[:-1]).tolist()
+        print("\n==== Spreading contents over %d unused bytes..." % (self.size - self.cursor))  # TRACING
+        # Contents are moved from the last one on, so each of them is only moved onto free space or onto itself
+        for i in reversed(range(len(self.starts))):
+            start, end, shift = self.starts[i], self.ends[i], shifts[i]
+            for block_end in range(end, start, -self.BLOCK_SIZE):
+                block_start = max(start, block_end - self.BLOCK_SIZE)
+                block = os.pread(self.image_file.fileno(), block_end - block_start, block_start)
+                os.pwrite(self.image_file.fileno(), block, block_start + shift)
+        for chunk in self.all_chunks + [chunk for file in self.files for chunk in file.get_chunks()]:
+            shift = shifts[bisect.bisect_right(self.starts, chunk.offset) - 1]
+            chunk.set_location(self.image_filename, chunk.offset + shift, len(chunk))
+            chunk.set_offset(chunk.offset + shift)
+        self.starts = [start + shift for start, shift in zip(self.starts, shifts)]
+        self.ends = [end + shift for end, shift in zip(self.ends, shifts)]
+        self.cursor = self.ends[-1] if self.ends else 0
+
+    # Return position of next slot of length bytes after a random gap and reserve it (called with lock held)
+    def _reserve(self, length):
+        if self.cursor + length > self.size:
+            raise Exception("Disk image too small for files. No free space for content of %d bytes is left." % length)
+        # Each content gets a share of the gap budget proportional to its length (on average)
+        mean_gap = self.gap_budget * length // max(self.expected_size, length, 1)
+        gap = min(int(self.rng.integers(0, 2 * mean_gap, endpoint=True)), self.gap_budget,
+                  self.size - self.cursor - length)
+        self.gap_budget -= gap
+        self.expected_size = max(0, self.expected_size - length)
+        position = self.cursor + gap
+        self.starts.append(position)
+        self.ends.append(position + length)
+        self.cursor = position + length
+        return position
@@ -1,42 +1,262 @@
+import time
 import threading
+import multiprocessing
+from queue import Full
 from multiprocessing import Queue
 from .core import Stage
+from .Profiler import Profiler
+from .ChunkStore import ChunkStore
 
 
 """
-Definition of Pipeline
+Definition of PipelineQueue, Pipeline, PipelineWorker and PipelinePool
 """
 
 
+class PipelineQueue():
+    """ Queue of Filenames for a Pipeline with an Optional Capacity.
+    A Full Queue Blocks the Harvester (Backpressure). The Depth of the Queue Is Recorded. """
+
+    # Seconds between checks whether the consumer of a full queue is still running
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, capacity: int = 0):
+        self.capacity = capacity  # Maximum number of queued batches (0 means unbounded)
+        self.queue = Queue(capacity)
+        # Function that returns False once the consumer has exited (a full queue is never emptied then)
+        self.is_consuming = None
+        # Metrics of queue
+        self.puts = 0
+        self.max_depth = 0
+        self.blocked_puts = 0  # Number of puts that had to wait for free space
+        self.blocked_time = 0.0  # Time the producer has been blocked
+
+    # Set function that tells whether the consumer of the queue is still running
+    def set_consumer(self, is_consuming):
+        self.is_consuming = is_consuming
+
+    # Put item into queue. If queue is full, wait until there is free space
+    # (if timeout is given, queue.Full is raised after timeout seconds).
+    # An exception is raised if the consumer exits while the queue is full.
+    def put(self, item, timeout: float = None):
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.blocked_puts += 1
+            start = time.perf_counter()
+            try:
+                self._put_blocking(item, start, timeout)
+            finally:
+                self.blocked_time += time.perf_counter() - start
+        self.puts += 1
+        depth = self.depth()
+        if depth is not None and depth > self.max_depth:
+            self.max_depth = depth
+
+    # Wait for free space in steps of CHECK_INTERVAL and check in between if the consumer is still running
+    def _put_blocking(self, item, start, timeout):
+        while True:
+            wait = self.CHECK_INTERVAL
+            if timeout is not None:
+                wait = max(0.0, min(wait, start + timeout - time.perf_counter()))
+            try:
+                self.queue.put(item, timeout=wait)
+                return
+            except Full:
+                if timeout is not None and time.perf_counter() - start >= timeout:
+                    raise
+                if self.is_consuming is not None and not self.is_consuming():
+                    raise Exception("Consumer of queue has exited, queued files can't be processed.")
+
+    def get(self):
+        return self.queue.get()
+
+    def empty(self):
+        return self.queue.empty()
+
+    # Return number of queued items (None if platform doesn't support it)
+    def depth(self):
+        try:
+            return self.queue.qsize()
+        except NotImplementedError:
+            return None
+
+    def get_metrics(self):
+        return {"capacity": self.capacity, "depth": self.depth(), "max_depth": self.max_depth, "puts": self.puts,
+                "blocked_puts": self.blocked_puts, "blocked_time": self.blocked_time}
+
+
+# Process batch of (filename, file type) tuples by linked list of stages.
+# Returns processed contents of last file.
+def process_batch(batch: list, first_stage: Stage, name: str, contents_path: str, profiler: Profiler = None):
+    proc_content = None
+    for filename, file_type in batch:
+        file_start = time.perf_counter()
+        print("\n==== %s got '%s'" % (name, filename.split('/')[-1]))
+
+        first_stage.set_name(filename)
+        first_stage.set_contents_path(contents_path)
+        first_stage.set_type(file_type)
+        first_stage.start()  # Initiate pipeline processing by calling start method of first stage
+        proc_content = first_stage.output()
+        if profiler is not None:
+            profiler.record_file(name, filename, file_start, time.perf_counter())
+        print("\n==== %s finished to process '%s'" % (name, filename.split('/')[-1]))  # TRACING
+    return proc_content
+
+
+# Take filenames out of queue and process them by linked list of stages until "/END/" is received.
+# Filenames are queued in batches along with their file type (or None if the type is not known yet).
+# Processed contents are written to the chunk store of the given name.
+# Returns processed contents of last file.
+def process_queue(queue: Queue, first_stage: Stage, name: str, contents_path: str, store_name: str,
+                  profiler: Profiler = None):
+    proc_content = None
+    chunk_store = ChunkStore(contents_path, store_name)
+    first_stage.set_chunk_store(chunk_store)
+    if profiler is not None:
+        first_stage.set_profiler(profiler, name)
+
+    while True:
+        wait_start = time.perf_counter()
+        item = queue.get()
+        if profiler is not None:
+            profiler.record_wait(name, wait_start, time.perf_counter())
+        # "/END/" indicates that there are no more filenames to collect
+        if item == "/END/":
+            break
+        proc_content = process_batch(item, first_stage, name, contents_path, profiler)
+
+    first_stage.close()
+    chunk_store.close()
+    return proc_content
+
+
 class Pipeline(threading.Thread):
     """ Pipeline Class Handles Stages / Processing Steps. """
 
-    def __init__(self, first_stage: Stage, file_type: str, contents_path: str):
+    def __init__(self, first_stage: Stage, file_type: str, contents_path: str, profiler: Profiler = None,
+                 capacity: int = 0):
         super(Pipeline, self).__init__()
         self.first_stage = first_stage  # Linked list of stages
         self.file_type = file_type  # File type of file that is to process (JPEG, ELF ect.)
         self.contents_path = contents_path  # Path where contents can be stored by stages
+        self.profiler = profiler  # Records statistics of stages (optional)
         self.proc_content = None
-        self.queue = Queue()  # Tracked data objects are put in here so that the pipeline can access them
+        # Tracked data objects are put in here so that the pipeline can access them
+        self.queue = PipelineQueue(capacity)
+        self.queue.set_consumer(self.is_consuming)
+
+    # Return False if pipeline has exited (True as long as it hasn't been started)
+    def is_consuming(self):
+        return self.ident is None or self.is_alive()
+
+    def add_to_queue(self, filename: str, file_type: str = None, timeout: float = None):
+        if filename == "/END/":
+            self.queue.put(filename)
+        else:
+            self.queue.put([(filename, file_type)], timeout)
+
+    # Put list of (filename, file type) tuples into queue at once
+    def add_batch(self, batch: list, timeout: float = None):
+        self.queue.put(batch, timeout)
 
-    def add_to_queue(self, filename: str):
-        self.queue.put(filename)
+    def get_queue_metrics(self):
+        return self.queue.get_metrics()
 
     def output(self):
         return self.proc_content
 
     # Initiate pipeline processing by taking one filename out of the queue and processing it
     def run(self):
-        print("==== Starting", self.file_type + "-Pipeline" + "...")
+        name = self.file_type + "-Pipeline"
+        print("==== Starting", name + "...")
+        self.proc_content = process_queue(self.queue, self.first_stage, name, self.contents_path, self.file_type,
+                                          self.profiler)
+        print("\n==== %s exiting..." % name)  # TRACING
 
-        # "/END/" indicates that there are no more filenames to collect
-        for filename in iter(self.queue.get, "/END/"):
-            print("\n==== %s got '%s'" % (self.file_type + "-Pipeline", filename.split('/')[-1]))
 
-            self.first_stage.set_name(filename)
-            self.first_stage.set_contents_path(self.contents_path)
-            self.first_stage.start()  # Initiate pipeline processing by calling start method of first stage
-            self.proc_content = self.first_stage.output()
-            print("\n==== %s finished to process '%s'" % (self.file_type + "-Pipeline", filename.split('/')[-1]))  # TRACING
+class PipelineWorker(multiprocessing.Process):
+    """ Worker Process of a PipelinePool.
+    Builds Its Own Linked List of Stages Since Stages Keep Per-File State. """
+
+    def __init__(self, pipeline: dict, create_stages, file_type: str, contents_path: str, queue: Queue,
+                 number: int, results: Queue = None, trace: bool = False):
+        super(PipelineWorker, self).__init__()
+        self.pipeline = pipeline  # Pipeline definition of JSON file (e.g. {'stages': [{'FileJPEG': []}, ...]})
+        self.create_stages = create_stages  # Function that builds up a linked list of stages out of definition
+        self.file_type = file_type
+        self.contents_path = contents_path
+        self.queue = queue  # Queue shared by all workers of the same pool
+        self.number = number  # Number of worker within its pool
+        # If set, the worker profiles its stages and puts the records in here when it exits
+        self.results = results
+        self.trace = trace  # If True, single events are recorded for a Chrome trace file
+
+    # Take filenames out of the shared queue until "/END/" is received
+    def run(self):
+        print("==== Starting %s-Pipeline[%d]..." % (self.file_type, self.number))  # TRACING
+        first_stage = self.create_stages(self.pipeline)  # Stage chain is only created inside the worker process
+        profiler = None
+        if self.results is not None:
+            profiler = Profiler(self.trace)
+        # Each worker writes to its own chunk store
+        process_queue(self.queue, first_stage, self.file_type + "-Pipeline", self.contents_path,
+                      "%s_%d" % (self.file_type, self.number), profiler)
+        if profiler is not None:
+            self.results.put(profiler.get_records())
+        print("\n==== %s-Pipeline[%d] exiting..." % (self.file_type, self.number))  # TRACING
+
+
+class PipelinePool():
+    """ Pool of PipelineWorker Processes Consuming from One Queue.
+    Behaves Like a Pipeline for the Harvester. """
+
+    def __init__(self, pipeline: dict, create_stages, file_type: str, contents_path: str, num_workers: int,
+                 profiler: Profiler = None, capacity: int = 0):
+        self.file_type = file_type
+        self.contents_path = contents_path
+        self.profiler = profiler  # Records of all workers are merged into this profiler
+        # Tracked data objects are put in here so that all workers can access them
+        self.queue = PipelineQueue(capacity)
+        self.results = None
+        trace = False
+        if profiler is not None:
+            self.results = Queue()
+            trace = profiler.trace
+        self.workers = []
+        for i in range(num_workers):
+            self.workers.append(PipelineWorker(pipeline, create_stages, file_type, contents_path, self.queue.queue,
+                                               i, self.results, trace))
+        self.queue.set_consumer(self.is_consuming)
+
+    # Return False if all workers have exited (True as long as they haven't been started)
+    def is_consuming(self):
+        return any(worker.pid is None or worker.is_alive() for worker in self.workers)
+
+    # "/END/" has to be received by every single worker
+    def add_to_queue(self, filename: str, file_type: str = None, timeout: float = None):
+        if filename == "/END/":
+            for i in range(len(self.workers)):
+                self.queue.put(filename)
+        else:
+            self.queue.put([(filename, file_type)], timeout)
+
+    # Put list of (filename, file type) tuples into queue at once
+    def add_batch(self, batch: list, timeout: float = None):
+        self.queue.put(batch, timeout)
+
+    def get_queue_metrics(self):
+        return self.queue.get_metrics()
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
 
-        print("\n==== %s exiting..." % (self.file_type + "-Pipeline"))  # TRACING
+    def join(self):
+        # Records have to be taken out of the queue before workers can terminate
+        if self.profiler is not None:
+            for i in range(len(self.workers)):
+                self.profiler.merge(self.results.get())
+        for worker in self.workers:
+            worker.join()
@@ -1,6 +1,10 @@
+import os
 from .core import Harvester, pipeline_by_file_type
-from .Pipeline import Pipeline
-from .stages import *  # Need to know each possible Stage subclass for building up Pipelines
+from .Pipeline import Pipeline, PipelinePool
+from .Profiler import Profiler
+from .Scheduler import WorkStealingScheduler
+from . import registry  # Stage subclasses are looked up by name (and imported on first use)
+from .Compiler import validate_pipeline
 
 """
 Definition of PipelineController
@@ -12,12 +16,19 @@ class PipelineController():
     Interface Between Harvester and Pipelines.
     Implementing Producer-Consumer Pattern. """
 
-    def __init__(self, harvester: Harvester, file_types: list, pipelines: list, contents_path: str):
+    def __init__(self, harvester: Harvester, file_types: list, pipelines: list, contents_path: str,
+                 profiling: dict = None, scheduler: dict = None, direct: bool = False):
         self.harvester = harvester
         self.file_types = file_types  # List of file types for each pipeline
         self.pipelines = pipelines
         # Path where contents can be written to by a pipeline stage
         self.contents_path = contents_path
+        # Paths of profiling report and Chrome trace file (e.g. {"report": ["profile.json"], "trace": ["trace.json"]})
+        self.profiling = profiling
+        # Options of shared worker pool for all file types (e.g. {"workers": [8]}), None means one consumer per pipeline
+        self.scheduler = scheduler
+        # True if chunks are written directly into the image (sampler option "direct")
+        self.direct = direct
 
     def reset(self):
         global pipeline_by_file_type
@@ -46,16 +57,49 @@ class PipelineController():
     def start_all_pipelines(self):
         global pipeline_by_file_type
         consumers = []
+        profiler = None
+        # Invalid pipelines are rejected before the Harvester passes on any file
+        for file_type, pipeline in zip(self.file_types, self.pipelines):
+            validate_pipeline(pipeline, file_type, self.direct)
+        if self.direct and self.scheduler is not None:
+            raise Exception('The sampler option "direct" can\'t be combined with the "scheduler".')
+        if self.profiling is not None:
+            profiler = Profiler(trace="trace" in self.profiling)
+        if self.scheduler is not None:
+            self._start_scheduler(profiler)
+            return
         # Each pipeline is a consumer
         num_consumers = len(self.pipelines)
 
         stages = []  # List of linked lists of stages for each pipeline
         for pipeline in self.pipelines:
-            stages.append(self._create_stages(pipeline["stages"]))
+            stages.append(self._build_stages(pipeline))
 
-        # Create consumer threads
+        # Create consumer threads (or pools of worker processes if "workers" is defined for a pipeline)
         for i in range(num_consumers):
-            pipe = Pipeline(stages[i], self.file_types[i], self.contents_path)
+            num_workers = self._get_num_workers(self.pipelines[i])
+            # Maximum number of queued batches of filenames (a full queue blocks the Harvester)
+            capacity = self.pipelines[i].get("queue", [0])[0]
+            runtime = self.pipelines[i].get("runtime", ["thread"])[0]
+            if runtime == "async":
+                if num_workers is not None:
+                    raise Exception('The "async" runtime can\'t be combined with "workers".')
+                # Maximum number of files processed at once, each of them by its own linked list of stages
+                in_flight = self.pipelines[i].get("in_flight", [4])[0]
+                if in_flight < 1:
+                    raise Exception('Number of files "in_flight" must be at least 1.')
+                # (asyncio is only imported if a pipeline uses it)
+                from .AsyncPipeline import AsyncPipeline
+                pipe = AsyncPipeline(self.pipelines[i], PipelineController._build_stages, self.file_types[i],
+                                     self.contents_path, in_flight, profiler, capacity)
+            elif runtime != "thread":
+                raise Exception('Unknown runtime "%s". Supported: thread, async.' % runtime)
+            elif num_workers is None:
+                pipe = Pipeline(stages[i], self.file_types[i], self.contents_path, profiler, capacity)
+            else:
+                # Each worker process creates its own linked list of stages
+                pipe = PipelinePool(self.pipelines[i], PipelineController._build_stages,
+                                    self.file_types[i], self.contents_path, num_workers, profiler, capacity)
             pipeline_by_file_type[self.file_types[i]] = pipe  # Add pipeline instance to global dictionary
             consumers.append(pipe)
 
@@ -68,9 +112,78 @@ class PipelineController():
         self.harvester.join()
         for c in consumers:
             c.join()
+        if self.harvester.get_error() is not None:
+            raise self.harvester.get_error()
+
+        if profiler is not None:
+            for file_type, pipe in zip(self.file_types, consumers):
+                profiler.set_queue_metrics(file_type + "-Pipeline", pipe.get_queue_metrics())
+            self._write_profile(profiler)
 
         print("\nPipelineController exiting...")  # TRACING
 
+    # Let one pool of worker processes work on all pipelines.
+    # Idle workers steal filenames from the queues of other file types.
+    def _start_scheduler(self, profiler):
+        global pipeline_by_file_type
+        num_workers = self._get_num_workers(self.scheduler)
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        pipelines = dict(zip(self.file_types, self.pipelines))
+        capacities = {file_type: pipeline.get("queue", [0])[0] for file_type, pipeline in pipelines.items()}
+        scheduler = WorkStealingScheduler(pipelines, PipelineController._build_stages, self.contents_path,
+                                          num_workers, profiler, capacities)
+        for file_type in self.file_types:
+            pipeline_by_file_type[file_type] = scheduler.get_pipeline(file_type)
+
+        self.harvester.start()
+        scheduler.start()
+        self.harvester.join()
+        scheduler.join()
+        if self.harvester.get_error() is not None:
+            raise self.harvester.get_error()
+
+        if profiler is not None:
+            for file_type in self.file_types:
+                metrics = scheduler.get_pipeline(file_type).get_queue_metrics()
+                profiler.set_queue_metrics(file_type + "-Pipeline", metrics)
+            self._write_profile(profiler)
+
+        print("\nPipelineController exiting...")  # TRACING
+
+    # Write profiling report (and Chrome trace file if requested)
+    def _write_profile(self, profiler):
+        report_path = self.profiling.get("report", ["profile.json"])[0]
+        profiler.write_report(report_path)
+        print("\n==== Profiling report has been written to", report_path)  # TRACING
+        if "trace" in self.profiling:
+            trace_path = self.profiling["trace"][0]
+            profiler.write_trace(trace_path)
+            print("\n==== Trace file has been written to", trace_path)  # TRACING
+
+    # Return number of worker processes for a pipeline or None if the pipeline is supposed to run as a thread.
+    # E.g.: pipeline = {'stages': [...], 'workers': [4]} (0 workers means one worker per CPU core)
+    @staticmethod
+    def _get_num_workers(pipeline):
+        if "workers" not in pipeline:
+            return None
+        num_workers = pipeline["workers"][0]
+        if num_workers == 0:
+            num_workers = os.cpu_count() or 1
+        elif num_workers < 0:
+            raise Exception('Number of "workers" must not be negative.')
+        return num_workers
+
+    # Create linked list of stages for pipeline definition and set options of first stage
+    # E.g.: pipeline = {'stages': [...], 'stream': [true]}
+    @staticmethod
+    def _build_stages(pipeline):
+        first_stage = PipelineController._create_stages(pipeline["stages"])
+        if pipeline.get("stream", [False])[0]:
+            # File is passed through stages in blocks
+            first_stage.set_stream(True)
+        return first_stage
+
     # Create linked list of stages.
     # Stages are identified by names of Stage subclasses.
     # E.g.: stages = [{'FileJPEG': []}, {'HeaderJPEG': []}, {'Split': [1000]}, ...]
@@ -80,7 +193,7 @@ class PipelineController():
         for stage in stages:
             stage_name = list(stage.keys())[0]  # Extract Stage name from dictionary
             parameters = stage[stage_name]  # A list of optional parameters for the stage
-            stage_class = globals()[stage_name]  # Get ABCMeta class that represents the stage
+            stage_class = registry.stages.get(stage_name)  # Get ABCMeta class that represents the stage
             current_stage = stage_class(parameters)  # Create instance of Stage class
             # Save first stage
             if previous_stage is None:
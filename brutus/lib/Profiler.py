@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import threading
+
+"""
+Definition of Profiler
+"""
+
+
+class Profiler():
+    """ Records Wall Time, Bytes, Chunk Counts and Queue Wait Time
+    for Each Stage Class and Each Pipeline. """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace  # If True, single events are kept for a Chrome trace file
+        self.lock = threading.Lock()  # Pipeline threads share one profiler
+        # Statistics of stage hooks by pipeline, stage class and phase ("pre", "main", "post")
+        self.stages = {}
+        # Statistics of pipelines by pipeline name
+        self.pipelines = {}
+        self.queues = {}  # Metrics of queue by pipeline name
+        self.events = []  # Chrome trace events
+
+    # Call stage hook (e.g. _do_main) and record its statistics
+    def measure(self, stage, phase: str, hook, contents, pipeline_name: str):
+        chunks_in, bytes_in = self._size_of(contents)
+        start = time.perf_counter()
+        contents = hook(contents)
+        end = time.perf_counter()
+        chunks_out, bytes_out = self._size_of(contents)
+
+        stage_name = type(stage).__name__
+        with self.lock:
+            stats = self.stages.setdefault(pipeline_name, {}).setdefault(stage_name, {}).setdefault(
+                phase, self._new_stats())
+            stats["calls"] += 1
+            stats["time"] += end - start
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["chunks_in"] += chunks_in
+            stats["chunks_out"] += chunks_out
+            if self.trace:
+                self._add_event("%s._do_%s" % (stage_name, phase), pipeline_name, start, end,
+                                {"file": os.path.basename(stage.get_name() or ""), "bytes_in": bytes_in,
+                                 "bytes_out": bytes_out})
+        return contents
+
+    # Record time a pipeline waited for the next filename in its queue
+    def record_wait(self, pipeline_name: str, start: float, end: float):
+        with self.lock:
+            stats = self._get_pipeline(pipeline_name)
+            stats["queue_waits"] += 1
+            stats["queue_wait_time"] += end - start
+            if self.trace:
+                self._add_event("queue wait", pipeline_name, start, end, {})
+
+    # Record time a pipeline needed for processing one file
+    def record_file(self, pipeline_name: str, filename: str, start: float, end: float):
+        with self.lock:
+            stats = self._get_pipeline(pipeline_name)
+            stats["files"] += 1
+            stats["processing_time"] += end - start
+            if self.trace:
+                self._add_event(os.path.basename(filename), pipeline_name, start, end, {})
+
+    # Set metrics of pipeline's queue (e.g. depth, time the Harvester has been blocked)
+    def set_queue_metrics(self, pipeline_name: str, metrics: dict):
+        with self.lock:
+            self.queues[pipeline_name] = metrics
+
+    # Return all records (e.g. to send them from a worker process to the main process)
+    def get_records(self):
+        with self.lock:
+            return {"stages": self.stages, "pipelines": self.pipelines, "events": self.events}
+
+    # Add records of another profiler (e.g. of a worker process)
+    def merge(self, records: dict):
+        with self.lock:
+            for pipeline_name, stage_stats in records["stages"].items():
+                for stage_name, phase_stats in stage_stats.items():
+                    for phase, stats in phase_stats.items():
+                        own_stats = self.stages.setdefault(pipeline_name, {}).setdefault(
+                            stage_name, {}).setdefault(phase, self._new_stats())
+                        for key, value in stats.items():
+                            own_stats[key] += value
+            for pipeline_name, stats in records["pipelines"].items():
+                own_stats = self._get_pipeline(pipeline_name)
+                for key, value in stats.items():
+                    own_stats[key] += value
+            self.events.extend(records["events"])
+
+    # Return report of all statistics by pipeline and by stage class
+    def report(self):
+        with self.lock:
+            report = {"pipelines": {}, "stages": {}}
+            for pipeline_name, stats in self.pipelines.items():
+                report["pipelines"][pipeline_name] = dict(stats, queue=self.queues.get(pipeline_name, {}),
+                                                          stages=self.stages.get(pipeline_name, {}))
+            # Sum up statistics of each stage class over all pipelines
+            for stage_stats in self.stages.values():
+                for stage_name, phase_stats in stage_stats.items():
+                    for phase, stats in phase_stats.items():
+                        total = report["stages"].setdefault(stage_name, {}).setdefault(phase, self._new_stats())
+                        for key, value in stats.items():
+                            total[key] += value
+            # Throughput of each stage class in MB/s
+            for stage_name, phase_stats in report["stages"].items():
+                for stats in phase_stats.values():
+                    if stats["time"] > 0:
+                        stats["throughput"] = stats["bytes_in"] / stats["time"] / 10**6
+            return report
+
+    # Write report as JSON file
+    def write_report(self, path: str):
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=4)
+
+    # Write events as Chrome trace file (can be opened with chrome://tracing)
+    def write_trace(self, path: str):
+        with self.lock:
+            with open(path, 'w') as trace_file:
+                json.dump({"traceEvents": self.events}, trace_file)
+
+    def _get_pipeline(self, pipeline_name):
+        return self.pipelines.setdefault(pipeline_name, {"files": 0, "processing_time": 0.0,
+                                                         "queue_waits": 0, "queue_wait_time": 0.0})
+
+    def _add_event(self, name, pipeline_name, start, end, args):
+        self.events.append({"name": name, "cat": pipeline_name, "ph": "X", "ts": start * 10**6,
+                            "dur": (end - start) * 10**6, "pid": os.getpid(), "tid": threading.get_ident(),
+                            "args": args})
+
+    @staticmethod
+    def _new_stats():
+        return {"calls": 0, "time": 0.0, "bytes_in": 0, "bytes_out": 0, "chunks_in": 0, "chunks_out": 0}
+
+    # Return number of chunks and bytes of contents
+    @staticmethod
+    def _size_of(contents):
+        if contents is None:
+            return 0, 0
+        return len(contents), sum(len(content) for content in contents if content is not None)
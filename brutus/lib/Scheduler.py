@@ -0,0 +1,168 @@
+import time
+import multiprocessing
+from queue import Empty
+from multiprocessing import Queue
+from .Pipeline import PipelineQueue, process_batch
+from .Profiler import Profiler
+from .ChunkStore import ChunkStore
+
+
+"""
+Definition of ScheduledPipeline, StealingWorker and WorkStealingScheduler
+"""
+
+
+class ScheduledPipeline():
+    """ Queue of One File Type Whose Filenames Are Processed by the Workers of a WorkStealingScheduler.
+    Behaves Like a Pipeline for the Harvester. """
+
+    def __init__(self, file_type: str, capacity: int = 0):
+        self.file_type = file_type
+        self.queue = PipelineQueue(capacity)
+        self.workers = []  # Workers of the scheduler that take filenames out of the queue
+        self.queue.set_consumer(self.is_consuming)
+
+    # Return False if all workers have exited (True as long as they haven't been started)
+    def is_consuming(self):
+        return any(worker.pid is None or worker.is_alive() for worker in self.workers)
+
+    # "/END/" is put only once, each worker puts it back for the others
+    def add_to_queue(self, filename: str, file_type: str = None, timeout: float = None):
+        if filename == "/END/":
+            self.queue.put(filename)
+        else:
+            self.queue.put([(filename, file_type)], timeout)
+
+    # Put list of (filename, file type) tuples into queue at once
+    def add_batch(self, batch: list, timeout: float = None):
+        self.queue.put(batch, timeout)
+
+    def get_queue_metrics(self):
+        return self.queue.get_metrics()
+
+
+class StealingWorker(multiprocessing.Process):
+    """ Worker Process That Prefers the Queue of Its Own File Type.
+    If This Queue Is Empty, It Steals Filenames from the Queues of Other File Types.
+    Linked Lists of Stages Are Only Created for File Types the Worker Actually Processes. """
+
+    # Seconds to wait for a filename if all queues are empty
+    POLL_TIMEOUT = 0.05
+
+    def __init__(self, pipelines: dict, create_stages, queues: dict, home_type: str, contents_path: str,
+                 number: int, results: Queue = None, trace: bool = False):
+        super(StealingWorker, self).__init__()
+        self.pipelines = pipelines  # Pipeline definition of JSON file by file type
+        self.create_stages = create_stages  # Function that builds up a linked list of stages out of definition
+        self.queues = queues  # Queue of each file type
+        self.home_type = home_type  # File type whose queue is preferred
+        self.contents_path = contents_path
+        self.number = number  # Number of worker within the scheduler
+        # If set, the worker profiles its stages and puts the records in here when it exits
+        self.results = results
+        self.trace = trace
+
+    def run(self):
+        print("==== Starting Worker[%d] (%s)..." % (self.number, self.home_type))  # TRACING
+        profiler = None
+        if self.results is not None:
+            profiler = Profiler(self.trace)
+        # Own file type first, then all other file types in order
+        file_types = list(self.queues)
+        position = file_types.index(self.home_type)
+        file_types = file_types[position:] + file_types[:position]
+        finished = set()  # File types whose queues have received "/END/"
+        stages = {}  # Linked list of stages by file type
+        stores = {}  # Chunk store by file type
+
+        while len(finished) < len(file_types):
+            wait_start = time.perf_counter()
+            file_type, item = self._take(file_types, finished)
+            if profiler is not None:
+                profiler.record_wait(self.home_type + "-Pipeline", wait_start, time.perf_counter())
+            if item is None:
+                continue
+            if item == "/END/":
+                # Other workers need to receive "/END/" as well
+                self.queues[file_type].put("/END/")
+                finished.add(file_type)
+                continue
+
+            if file_type not in stages:
+                stages[file_type] = self.create_stages(self.pipelines[file_type])
+                stores[file_type] = ChunkStore(self.contents_path, "%s_%d" % (file_type, self.number))
+                stages[file_type].set_chunk_store(stores[file_type])
+                if profiler is not None:
+                    stages[file_type].set_profiler(profiler, file_type + "-Pipeline")
+            if file_type != self.home_type:
+                print("\n==== Worker[%d] steals from %s queue" % (self.number, file_type))  # TRACING
+            process_batch(item, stages[file_type], file_type + "-Pipeline", self.contents_path, profiler)
+
+        for first_stage in stages.values():
+            first_stage.close()
+        for chunk_store in stores.values():
+            chunk_store.close()
+        if profiler is not None:
+            self.results.put(profiler.get_records())
+        print("\n==== Worker[%d] exiting..." % self.number)  # TRACING
+
+    # Return (file type, item) of first queue that is not empty.
+    # If all queues are empty, wait shortly for the first unfinished queue (item is None on timeout).
+    def _take(self, file_types, finished):
+        unfinished = [file_type for file_type in file_types if file_type not in finished]
+        for file_type in unfinished:
+            try:
+                return file_type, self.queues[file_type].get_nowait()
+            except Empty:
+                continue
+        try:
+            return unfinished[0], self.queues[unfinished[0]].get(timeout=self.POLL_TIMEOUT)
+        except Empty:
+            return unfinished[0], None
+
+
+class WorkStealingScheduler():
+    """ Pool of Worker Processes Shared by All File Types.
+    Each Worker Has a Preferred File Type but Steals Work from Other File Types When It Is Idle,
+    so All Cores Stay Busy Whatever the Mix of File Types Is. """
+
+    def __init__(self, pipelines: dict, create_stages, contents_path: str, num_workers: int,
+                 profiler: Profiler = None, capacities: dict = None):
+        self.profiler = profiler  # Records of all workers are merged into this profiler
+        self.scheduled_pipelines = {}
+        for file_type in pipelines:
+            capacity = 0
+            if capacities is not None:
+                capacity = capacities.get(file_type, 0)
+            self.scheduled_pipelines[file_type] = ScheduledPipeline(file_type, capacity)
+        queues = {file_type: pipe.queue.queue for file_type, pipe in self.scheduled_pipelines.items()}
+
+        self.results = None
+        trace = False
+        if profiler is not None:
+            self.results = Queue()
+            trace = profiler.trace
+        self.workers = []
+        file_types = list(pipelines)
+        for i in range(num_workers):
+            # Preferred file types are assigned round-robin
+            self.workers.append(StealingWorker(pipelines, create_stages, queues, file_types[i % len(file_types)],
+                                               contents_path, i, self.results, trace))
+        for scheduled_pipeline in self.scheduled_pipelines.values():
+            scheduled_pipeline.workers = self.workers
+
+    # Return pipeline of file type that the Harvester puts filenames into
+    def get_pipeline(self, file_type: str):
+        return self.scheduled_pipelines[file_type]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def join(self):
+        # Records have to be taken out of the queue before workers can terminate
+        if self.profiler is not None:
+            for i in range(len(self.workers)):
+                self.profiler.merge(self.results.get())
+        for worker in self.workers:
+            worker.join()
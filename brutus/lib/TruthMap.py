@@ -0,0 +1,173 @@
+import mmap
+import struct
+from .ChunkHasher import ChunkHasher
+
+"""
+Definition of TruthMap
+"""
+
+
+class TruthMap():
+    """ Reader of a Binary Truth Map.
+    The File Consists of a Header, Fixed-Width Records Sorted by Offset, a Table of Filenames
+    and an Optional Sparse Index of Offsets. The Chunk Covering a Byte Is Found by Binary Search. """
+
+    MAGIC = b"BRUTUSTM"
+    VERSION = 1
+    # Header: magic, version, width of hash field, number of records, position of filename table,
+    # position of offset index (0 if there is none), number of records per index entry
+    HEADER = struct.Struct("<8sHHQQQI")
+    # Record: offset in image, size, index of filename, chunk number, hash algorithm, length of hash
+    # (followed by hash field of fixed width)
+    RECORD = struct.Struct("<QQIIBB")
+    OFFSET = struct.Struct("<Q")
+    NAME_LENGTH = struct.Struct("<H")
+    # Number of records per entry of offset index
+    INDEX_STEP = 1024
+    # Columns of text truth map
+    TEXT_HEADER = "{},\t{},\t{},\t{},\t{}\n\n".format("Number", "Size", "Chunk Offset", "File", "SHA-256 Hash")
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as map_file:
+            self.data = mmap.mmap(map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.hash_width, self.count, names_position, index_position, self.index_step = \
+            self.HEADER.unpack_from(self.data, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise Exception("%s is not a binary truth map of version %d." % (path, self.VERSION))
+        self.record_size = self.RECORD.size + self.hash_width
+
+        # Table of filenames
+        self.names = []
+        position = names_position
+        (num_names,) = self.OFFSET.unpack_from(self.data, position)
+        position += self.OFFSET.size
+        for i in range(num_names):
+            (length,) = self.NAME_LENGTH.unpack_from(self.data, position)
+            position += self.NAME_LENGTH.size
+            self.names.append(self.data[position:position + length].decode("utf-8", "surrogateescape"))
+            position += length
+
+        # Offsets of every index_step-th record (only kept in memory if the map has an index)
+        self.index = []
+        if index_position != 0:
+            num_entries = (self.count + self.index_step - 1) // self.index_step
+            self.index = list(struct.unpack_from("<%dQ" % num_entries, self.data, index_position))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.get_record(i)
+
+    # Return record i as tuple (number, size, offset, filename, hash)
+    def get_record(self, i: int):
+        position = self.HEADER.size + i * self.record_size
+        offset, size, name_index, number, algorithm, hash_length = self.RECORD.unpack_from(self.data, position)
+        position += self.RECORD.size
+        chunk_hash = self.format_hash(bytes(self.data[position:position + hash_length]), algorithm)
+        return number, size, offset, self.names[name_index], chunk_hash
+
+    # Return record of chunk that covers byte at position in image, None if the byte belongs to the background
+    def find(self, position: int):
+        low, high = 0, self.count
+        if self.index:
+            # Narrow down search to the records between two index entries
+            block, next_block = self._search(self.index, position, 0, len(self.index))
+            if block < 0:
+                return None
+            low, high = block * self.index_step, min(next_block * self.index_step, self.count)
+        low, high = self._search(_RecordOffsets(self), position, low, high)
+        if low < 0:
+            return None
+        record = self.get_record(low)
+        if position >= record[2] + record[1]:
+            return None
+        return record
+
+    # Write records in format of text truth map
+    def to_text(self, path: str):
+        with open(path, 'w') as truth_map:
+            truth_map.write(self.TEXT_HEADER)
+            for number, size, offset, filename, chunk_hash in self:
+                truth_map.write("{},\t{} B,\t{},\t{},\t{}\n".format(number, size, offset, filename, chunk_hash))
+
+    def close(self):
+        self.data.close()
+
+    # Write binary truth map of chunks sorted by offset (index_step 0 means no offset index)
+    @staticmethod
+    def write(path: str, chunks: list, index_step: int = INDEX_STEP):
+        names = {}  # Index of each filename
+        hashes = []  # (algorithm, hash) of each chunk
+        for chunk in chunks:
+            names.setdefault(chunk.filename, len(names))
+            hashes.append(TruthMap.parse_hash(chunk.get_sha256()))
+        hash_width = max((len(chunk_hash) for algorithm, chunk_hash in hashes), default=0)
+
+        records = bytearray()
+        for chunk, (algorithm, chunk_hash) in zip(chunks, hashes):
+            records += TruthMap.RECORD.pack(chunk.offset, len(chunk), names[chunk.filename], chunk.pos_number,
+                                            algorithm, len(chunk_hash))
+            records += chunk_hash.ljust(hash_width, b'\0')
+
+        name_table = bytearray(TruthMap.OFFSET.pack(len(names)))
+        for name in names:
+            name = name.encode("utf-8", "surrogateescape")
+            name_table += TruthMap.NAME_LENGTH.pack(len(name)) + name
+
+        names_position = TruthMap.HEADER.size + len(records)
+        index = b''
+        index_position = 0
+        if index_step > 0 and len(chunks) > 0:
+            offsets = [chunks[i].offset for i in range(0, len(chunks), index_step)]
+            index = struct.pack("<%dQ" % len(offsets), *offsets)
+            index_position = names_position + len(name_table)
+
+        with open(path, 'wb') as map_file:
+            map_file.write(TruthMap.HEADER.pack(TruthMap.MAGIC, TruthMap.VERSION, hash_width, len(chunks),
+                                                names_position, index_position, index_step))
+            map_file.write(records)
+            map_file.write(name_table)
+            map_file.write(index)
+
+    # Return (algorithm, hash) of hash string of truth map (e.g. "blake2b:8ac3...", SHA-256 has no prefix)
+    @staticmethod
+    def parse_hash(chunk_hash: str):
+        if not chunk_hash:
+            return 0, b''
+        name, separator, hex_hash = chunk_hash.rpartition(":")
+        return ChunkHasher.ALGORITHMS[name or "sha256"], bytes.fromhex(hex_hash)
+
+    # Return hash string of truth map
+    @staticmethod
+    def format_hash(chunk_hash: bytes, algorithm: int):
+        name = ChunkHasher.get_name(algorithm)
+        if name is None or name == "sha256":
+            return chunk_hash.hex()
+        return name + ":" + chunk_hash.hex()
+
+    # Return (i, i + 1) for last i in [low, high) with offsets[i] <= position (i is -1 if there is none)
+    @staticmethod
+    def _search(offsets, position, low, high):
+        first = low
+        while low < high:
+            middle = (low + high) // 2
+            if offsets[middle] <= position:
+                low = middle + 1
+            else:
+                high = middle
+        if low == first:
+            return -1, -1
+        return low - 1, low
+
+
+class _RecordOffsets():
+    """ Sequence of the Offsets of All Records (Read Directly out of the Memory Map). """
+
+    def __init__(self, truth_map: TruthMap):
+        self.truth_map = truth_map
+
+    def __getitem__(self, i):
+        position = TruthMap.HEADER.size + i * self.truth_map.record_size
+        return TruthMap.OFFSET.unpack_from(self.truth_map.data, position)[0]
@@ -0,0 +1,141 @@
+import io
+import re
+import bisect
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""
+Definition of VirtualImage and VirtualImageServer
+"""
+
+
+class VirtualImage(io.RawIOBase):
+    """ Read-Only File-Like Image That Is Never Written onto Storage.
+    Each Requested Byte Range Is Computed out of the Layout of the Chunks (Sorted by Offset),
+    Their Chunk Stores and a Seekable Background. """
+
+    def __init__(self, size: int, chunks: list, background):
+        io.RawIOBase.__init__(self)
+        if not background.seekable:
+            raise Exception("Background of a virtual image must be seekable.")
+        self.size = size
+        self.chunks = chunks  # Chunks sorted by offset
+        self.offsets = [chunk.get_offset() for chunk in chunks]
+        self.background = background
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Negative seek position %d" % offset)
+        self.position = offset
+        return self.position
+
+    def readinto(self, buffer):
+        data = self.read_at(self.position, len(buffer))
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    # Return bytes of image from position to position + length (without changing the current position)
+    def read_at(self, position: int, length: int):
+        length = max(0, min(length, self.size - position))
+        data = bytearray()
+        end = position + length
+        # First chunk that ends after position
+        i = bisect.bisect_right(self.offsets, position) - 1
+        if i < 0 or position >= self.offsets[i] + len(self.chunks[i]):
+            i += 1
+        while position < end:
+            if i < len(self.chunks) and position >= self.offsets[i]:
+                # Position lies within chunk i
+                start = position - self.offsets[i]
+                piece = self.chunks[i].get_content()[start:start + end - position]
+                i += 1
+            else:
+                # Position lies in the background up to the next chunk
+                next_offset = self.offsets[i] if i < len(self.chunks) else self.size
+                piece = self.background.get_block(position, min(next_offset, end) - position)
+            data += piece
+            position += len(piece)
+        return bytes(data)
+
+
+class VirtualImageServer(ThreadingHTTPServer):
+    """ HTTP Server That Serves a Virtual Image with Support for Range Requests. """
+
+    def __init__(self, virtual_image: VirtualImage, port: int, host: str = "127.0.0.1"):
+        ThreadingHTTPServer.__init__(self, (host, port), _RangeRequestHandler)
+        self.virtual_image = virtual_image
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """ Answers GET and HEAD Requests for (Ranges of) the Virtual Image. """
+
+    # Number of bytes computed and sent at once
+    PIECE_SIZE = 2**20
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body):
+        size = self.server.virtual_image.size
+        start, end = 0, size - 1
+        status = 200
+        if "Range" in self.headers:
+            byte_range = self._parse_range(self.headers["Range"], size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % size)
+                self.end_headers()
+                return
+            start, end = byte_range
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, size))
+        self.end_headers()
+        if not send_body:
+            return
+        for position in range(start, end + 1, self.PIECE_SIZE):
+            data = self.server.virtual_image.read_at(position, min(self.PIECE_SIZE, end + 1 - position))
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                return  # Client has closed connection
+
+    # Return (first byte, last byte) of range header (e.g. "bytes=0-499", "bytes=500-", "bytes=-500"),
+    # None if the range can't be satisfied
+    @staticmethod
+    def _parse_range(header, size):
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+        if match is None or match.group(1) == match.group(2) == "":
+            return None
+        if match.group(1) == "":
+            # Last bytes of image
+            start = max(0, size - int(match.group(2)))
+            end = size - 1
+        else:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else size - 1
+        end = min(end, size - 1)
+        if start > end:
+            return None
+        return start, end
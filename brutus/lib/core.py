@@ -1,8 +1,10 @@
 import threading
 import os
 import _io
+import hashlib
 from abc import ABCMeta, abstractmethod
-from random import randint, shuffle
+from .ChunkStore import ChunkStore
+from .Compiler import ExecutionPlan
 
 """
 Module of brutus core classes.
@@ -21,12 +23,37 @@ Definition of core classes:
 pipeline_by_file_type = {}
 
 
+# Return name under which the contents of a processed object are stored in the contents folder.
+# A truncated hash of the absolute path is prepended so that files with the same name in different
+# folders don't collide (e.g. /a/photo.jpg -> 3fa2c1b9_photo.jpg).
+def get_content_name(object_name: str):
+    hashed_path = hashlib.sha256(bytes(os.path.abspath(object_name), "utf-8")).hexdigest()
+    return hashed_path[:8] + '_' + os.path.basename(object_name)
+
+
+# Return filename of object whose contents are stored under content name (as written to the truth map)
+def get_original_filename(content_name: str):
+    return content_name.split('_', 1)[-1]
+
+
+# Return content as bytearray that can be modified.
+# Contents are views into the buffer of a read-in file, so they are only copied when a stage
+# writes to them (copy-on-write). This way, the buffer stays unchanged for all other views.
+def make_writable(content):
+    if isinstance(content, bytearray):
+        return content
+    return bytearray(content)
+
+
 class Harvester(threading.Thread, metaclass=ABCMeta):
     """ Basic Harvester Class. See Concrete Implementation for Details. """
 
     def __init__(self):
         super(Harvester, self).__init__()
         self.crop = []  # Maintain list of harvested objects (e.g. filenames etc)
+        self.crop_types = {}  # File type of each harvested object
+        self.excluded = set()  # Objects that are not supposed to be harvested (e.g. already processed files)
+        self.error = None  # Exception that stopped harvesting (raised again by PipelineController)
 
     @abstractmethod
     def run(self):
@@ -37,11 +64,49 @@ class Harvester(threading.Thread, metaclass=ABCMeta):
         """ Return list of harvested objects. """
         return self.crop
 
+    def get_crop_types(self):
+        """ Return dictionary of harvested objects and their file types. """
+        return self.crop_types
+
+    def set_excluded(self, excluded):
+        """ Set objects that are skipped when harvesting. """
+        self.excluded = set(excluded)
+
+    def get_error(self):
+        """ Return exception that stopped harvesting (None if harvesting has finished). """
+        return self.error
+
+    def get_expected_size(self):
+        """ Return expected size of all objects that are harvested in bytes (0 if unknown). """
+        return 0
+
 
 class Stage(metaclass=ABCMeta):
     """ The Basic/Abstract Class Definition of a Stage.
     Representing a Stage/Processing Step in a Pipeline. """
 
+    # True if each content is processed independently of the others.
+    # Such a stage processes streamed contents one by one instead of collecting all contents of a file first.
+    blockwise = False
+    # True if stage mainly waits for storage or network (e.g. reading or writing files).
+    # The asynchronous runtime runs hooks of such stages in a thread pool so that waiting overlaps with processing.
+    io_bound = False
+    # True if stage reads in the file and initiates the processing (only allowed as first stage)
+    initiating = False
+    # True if stage splits contents into smaller chunks
+    splitting = False
+    # True if stage only makes sense for a file that has not been split yet (e.g. removing a header)
+    whole_file = False
+    # True if _do_main maps each content to exactly one content independently of the others (e.g. adding noise).
+    # Adjacent transforms are fused, so each content passes through all of them at once.
+    transform = False
+    # True if stage writes or sends the processed contents (each pipeline needs at least one)
+    sink = False
+    # True if stage writes contents directly into the image (only allowed with the sampler option "direct")
+    direct = False
+    # Only type of files the stage works on (e.g. "JPEG"), None means any type
+    only_file_type = None
+
     def __init__(self, args: list):
         self.args = args  # args are optional parameters for subclasses
         # Needing name for identification (e.g. filename of processed object)
@@ -50,6 +115,13 @@ class Stage(metaclass=ABCMeta):
         self.contents_path = None
         # Next stage in pipeline
         self.next_stage = None
+        # Profiler that records statistics of stage hooks (only if profiling is enabled)
+        self.profiler = None
+        self.pipeline_name = None
+        # Store where processed contents of pipeline are written to
+        self.chunk_store = None
+        # Flat execution plan of this and all following stages (created on first processing)
+        self.plan = None
 
     # Getter, Setter for object name
     def get_name(self):
@@ -65,6 +137,29 @@ class Stage(metaclass=ABCMeta):
     def set_contents_path(self, contents_path):
         self.contents_path = contents_path
 
+    # Name under which contents of processed object are stored
+    def get_content_name(self):
+        return get_content_name(self.object_name)
+
+    # Set profiler of this and all following stages
+    def set_profiler(self, profiler, pipeline_name: str):
+        self.profiler = profiler
+        self.pipeline_name = pipeline_name
+        self.plan = None  # Profiled stages are not fused
+        if self.has_next_stage():
+            self.next_stage.set_profiler(profiler, pipeline_name)
+
+    # Set chunk store of this and all following stages
+    def set_chunk_store(self, chunk_store):
+        self.chunk_store = chunk_store
+        if self.has_next_stage():
+            self.next_stage.set_chunk_store(chunk_store)
+
+    # Release resources of this and all following stages after the last file (e.g. flush network connections)
+    def close(self):
+        if self.has_next_stage():
+            self.next_stage.close()
+
     # Add next stage in Stage for the pipeline
     def add_stage(self, next_stage):
         """
@@ -72,6 +167,7 @@ class Stage(metaclass=ABCMeta):
             next_stage: Following stage within the pipeline.
         """
         self.next_stage = next_stage
+        self.plan = None
 
     # Test if Stage object has a next stage
     def has_next_stage(self):
@@ -88,9 +184,6 @@ class Stage(metaclass=ABCMeta):
         :param contents: Content to pre-process.
         :returns: The processed content.
         """
-        if self.count_pre > 0:
-            for pre in self.pre_proc:
-                contents = pre.process(contents)
         return contents
 
     # Main stage processing function
@@ -106,39 +199,116 @@ class Stage(metaclass=ABCMeta):
     # Execute post-processing
     def _do_post(self, contents):
         """
-        :param contents: Content to pre-process.
+        :param contents: Content to post-process.
         :returns: The processed content.
         """
-        if self.count_post > 0:
-            for post in self.post_proc:
-                contents = post.process(contents)
         return contents
 
-    # Step through all pipeline stages
+    # Execute pre-, main- and post-processing
+    def _do_all(self, contents):
+        if self.profiler is None:
+            contents = self._do_pre(contents)
+            contents = self._do_main(contents)
+            contents = self._do_post(contents)
+        else:
+            contents = self.profiler.measure(self, "pre", self._do_pre, contents, self.pipeline_name)
+            contents = self.profiler.measure(self, "main", self._do_main, contents, self.pipeline_name)
+            contents = self.profiler.measure(self, "post", self._do_post, contents, self.pipeline_name)
+        return contents
+
+    # Step through all pipeline stages (by flat execution plan, see Compiler)
     def process(self, contents, object_name, contents_path):
         """
-        Process the stage and initiate the processing by the next stage.
+        Process the contents by this and all following stages.
         :param contents: The content to process.
         :returns: The processed contents.
         """
+        return self.get_plan().run(contents, object_name, contents_path)
 
-        # Name of processed object for next stage
-        self.object_name = object_name
-        # Path where to write contents to for next stage
-        self.contents_path = contents_path
-        contents = self._do_pre(contents)
-        contents = self._do_main(contents)
-        contents = self._do_post(contents)
-        if self.has_next_stage():
-            contents = self.next_stage.process(contents, self.object_name, self.contents_path)
-        return contents
+    # Step through all pipeline stages within an event loop.
+    # Hooks of I/O-bound stages are awaited in executor, all other hooks run directly.
+    async def process_async(self, contents, object_name, contents_path, executor):
+        """
+        Process the contents by this and all following stages.
+        :param contents: The content to process.
+        :param executor: Pool of threads that runs I/O-bound stages.
+        :returns: The processed contents.
+        """
+        return await self.get_plan().run_async(contents, object_name, contents_path, executor)
+
+    # Return flat execution plan of this and all following stages
+    def get_plan(self):
+        if self.plan is None:
+            self.plan = ExecutionPlan(self)
+        return self.plan
+
+    # Process stream of pieces (see iter_contents)
+    # Stages without their own stream put the pieces of each content back together first,
+    # so they get the same contents as in a list (every stage works in a stream).
+    def _do_stream(self, pieces):
+        """
+        :param pieces: Iterator of (piece, last) pairs to process.
+        :returns: Iterator of processed (piece, last) pairs.
+        """
+        if self.blockwise:
+            for content in iter_contents(pieces):
+                for new_content in self._do_all([join_pieces(content)]):
+                    yield new_content, True
+        else:
+            contents = [join_pieces(content) for content in iter_contents(pieces)]
+            for new_content in self._do_all(contents):
+                yield new_content, True
+
+    # Step through all pipeline stages with a stream of pieces instead of a list of contents
+    def process_stream(self, pieces, object_name, contents_path):
+        """
+        Chain the stream of the stage to the next stage. The last stage consumes the stream.
+        :param pieces: Iterator of (piece, last) pairs to process.
+        :returns: Number of pieces that have passed the last stage.
+        """
+        # Streams of all stages are chained in a loop
+        stage = self
+        while stage is not None:
+            stage.object_name = object_name
+            stage.contents_path = contents_path
+            pieces = stage._do_stream(pieces)
+            stage = stage.next_stage
+        num_pieces = 0
+        for piece in pieces:
+            num_pieces += 1
+        return num_pieces
+
+
+# A stream consists of (piece, last) pairs. The pieces of a content follow each other and last is True for
+# the last piece of each content, so bounded-size pieces of a large content keep its boundaries.
+# Return iterator over the contents of stream, each content is an iterator of its (piece, last) pairs
+# (a content has to be consumed before the next one).
+def iter_contents(pieces):
+    pieces = iter(pieces)
+    for piece, last in pieces:
+        yield _iter_content(piece, last, pieces)
+
+
+def _iter_content(piece, last, pieces):
+    yield piece, last
+    while not last:
+        piece, last = next(pieces)
+        yield piece, last
+
+
+# Return whole content of its (piece, last) pairs (a single piece is not copied)
+def join_pieces(content):
+    pieces = [piece for piece, last in content]
+    if len(pieces) == 1:
+        return pieces[0]
+    return b''.join(pieces)
 
 
 class Sampler(metaclass=ABCMeta):
     """ Basic Abstract Sampler Class. """
 
     # Set image size and path where contents are stored
-    def __init__(self, size: int, contents_path: str, image_path: str, merge_chunks: bool):
+    def __init__(self, size: int, contents_path: str, image_path: str, merge_chunks: bool, seed: int = None):
         # Convert image size from megabytes to bytes
         self.size = size * 1000000
         # Set path where contents are stored
@@ -147,6 +317,13 @@ class Sampler(metaclass=ABCMeta):
         self.image_path = image_path
         # Boolean value indicating whether single chunks of a file are shuffled in image or not
         self.merge_chunks = merge_chunks
+        # Seed for random layout and background (same seed results in same image).
+        # Without a seed, a random seed is drawn, so the image can still be regenerated.
+        import numpy  # Imported on first use, so processes that only run pipelines start faster
+        seed_sequence = numpy.random.SeedSequence(seed)
+        self.seed = seed_sequence.entropy
+        # Independent random streams of layout and background derived from seed
+        self.layout_seed, self.background_seed = seed_sequence.spawn(2)
 
         self.carving_image = bytearray()
         self.files = []  # list of ChunksOfFile
@@ -158,6 +335,12 @@ class Sampler(metaclass=ABCMeta):
 
     # Distribute contents (chunks or files) randomly in image
     def _distribute_contents(self):
+        # Contents are written in order of their offsets
+        for content in self._place_contents():
+            self._write_content(content.get_offset(), content)
+
+    # Set random non-overlapping offsets of contents (chunks or files) and return contents sorted by offset
+    def _place_contents(self):
         # Either chunks or files are the contents to distribute
         if not self.merge_chunks:
             self.all_chunks = []
@@ -168,24 +351,40 @@ class Sampler(metaclass=ABCMeta):
         else:
             all_contents = self.files
 
-        shuffle(all_contents)
-        available_size = len(self.carving_image) - self.reserved_size
-        gap_positions = sorted([randint(0, available_size) for i in range(len(all_contents))])
-        position = last_gap_position = 0
-        for content in all_contents:
-            gap_position = gap_positions.pop(0)  # Get the next gap
-            position += gap_position - last_gap_position  # Skip the next distance between gap positions
-            self.carving_image[position: position + len(content)] = content.get_content()
-
+        import numpy
+        rng = numpy.random.default_rng(self.layout_seed)
+        # Shuffle contents
+        all_contents[:] = [all_contents[i] for i in rng.permutation(len(all_contents))]
+        lengths = numpy.fromiter(map(len, all_contents), dtype=numpy.int64, count=len(all_contents))
+        # Sorted random gap positions within the space that is not reserved by contents
+        available_size = self.size - self.reserved_size
+        gap_positions = numpy.sort(rng.integers(0, available_size, size=len(all_contents), endpoint=True))
+        # Offset of a content is its gap position plus the lengths of all contents placed before it
+        offsets = gap_positions + numpy.cumsum(lengths) - lengths
+
+        for content, position in zip(all_contents, offsets.tolist()):
             if not self.merge_chunks:
                 # Set offset in Chunk object
                 content.set_offset(position)
             else:
                 # Set offsets in all Chunk objects
                 content.set_offsets(position)
+        return all_contents
 
-            position += len(content)
-            last_gap_position = gap_position
+    # Write content (chunk or file) to its position in image.
+    # Chunks of a file are written one by one, so a file is never concatenated in memory.
+    def _write_content(self, position, content):
+        if self.merge_chunks:
+            chunks = content.get_chunks()
+        else:
+            chunks = [content]
+        for chunk in chunks:
+            self._write_chunk(position, chunk)
+            position += len(chunk)
+
+    # Write single chunk to its position in image
+    def _write_chunk(self, position, chunk):
+        self.carving_image[position: position + len(chunk)] = chunk.get_content()
 
     # Fill the truth map
     @abstractmethod
@@ -223,39 +422,15 @@ class Content(metaclass=ABCMeta):
 class ChunksOfFile(Content):
     """ Class That Has All Chunks of One File. """
 
-    def __init__(self, filename):
+    def __init__(self, filename, chunks: list):
         Content.__init__(self, filename)
-        self.chunks = []  # List of Chunk objects
-        self._obtain_chunks()  # Build up Chunk list
+        self.chunks = chunks  # List of Chunk objects sorted by their numbers
         self.offset = self.chunks[0].get_offset()
 
     # Return total size of all chunks
     def __len__(self):
         return sum(map(len, self.chunks))
 
-    # Collect all chunks with attributes in current path and set self.chunks
-    def _obtain_chunks(self):
-        pos_number = 1
-        chunk_name = self.filename + "_" + str(pos_number)  # Name of first chunk file
-
-        # Create Chunk object as long as next chunk exists (first chunk always exists)
-        while os.path.isfile(chunk_name):
-            chunk = Chunk()
-            # Set chunk bytes to content in Chunk object
-            with open(chunk_name, mode='rb') as chunk_file:
-                chunk.set_content(chunk_file.read())
-            chunk.set_pos_number(pos_number)
-            chunk.set_filename(self.filename)
-            # Set hashed content in Chunk object
-            with open(os.path.join(os.getcwd(), "SHA-256 hashes", self.filename+".txt"), 'r') as hashes:
-                hashed_content = hashes.read().split('\n')[pos_number - 1]
-                chunk.set_sha256(hashed_content)
-            # Add Chunk object to Chunk list
-            self.chunks.append(chunk)
-            # Next chunk name comes with incremented position number
-            pos_number += 1
-            chunk_name = self.filename + "_" + str(pos_number)
-
     def get_chunks(self):
         return self.chunks
 
@@ -268,6 +443,7 @@ class ChunksOfFile(Content):
 
     # Set offsets of all Chunk objects (used when chunks stick together in storage)
     def set_offsets(self, position):
+        self.offset = position
         for chunk in self.chunks:
             chunk.set_offset(position)
             position += len(chunk)
@@ -285,6 +461,10 @@ class Chunk(Content):
     def __init__(self):
         Content.__init__(self)
         self.content = bytearray()
+        # Location of content in data file of a chunk store (content is only mapped in when it is needed)
+        self.data_path = None
+        self.data_offset = 0
+        self.length = 0
         self.pos_number = 0  # Number of chunk
         self.offset = 0  # Byte position in carving image
         self.filename = str()
@@ -292,16 +472,28 @@ class Chunk(Content):
 
     # Return number of bytes in content
     def __len__(self):
+        if self.data_path is not None:
+            return self.length
         return len(self.content)
 
     def __str__(self):
         return "{},\t{} B,\t{},\t{},\t{}".format(self.pos_number, len(self), self.offset, self.filename, self.sha256)
 
     def get_content(self):
+        if self.data_path is not None:
+            return ChunkStore.get_data_map(self.data_path)[self.data_offset:self.data_offset + self.length]
         return self.content
 
     def set_content(self, content):
         self.content = content
+        self.data_path = None
+
+    # Set location of content in data file instead of content itself
+    def set_location(self, data_path: str, data_offset: int, length: int):
+        self.data_path = data_path
+        self.data_offset = data_offset
+        self.length = length
+        self.content = None
 
     def get_pos_number(self):
         return self.pos_number
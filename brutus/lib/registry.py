@@ -0,0 +1,87 @@
+import importlib
+
+"""
+Definition of Registry and the registries of Stage, Harvester and Sampler classes.
+Components are looked up by the names used in the configuration and JSON file, e.g.:
+
+    @register_stage
+    class Reverse(Stage):
+        ...
+
+Third-party packages can provide components without editing brutus, either by a plugin module listed in the
+JSON file ("plugins":["mypackage.stages"]) or by an entry point of the group "brutus.stages",
+"brutus.harvesters" or "brutus.samplers" (name of the entry point is the name of the component).
+"""
+
+
+class Registry():
+    """ Registry of Component Classes by Name.
+    Classes Register Themselves by a Decorator When Their Module Is Imported.
+    Modules and Entry Points Are Only Imported When a Name Is Looked Up That Is Not Registered Yet,
+    so Starting a Process Doesn't Import Components (and Their Dependencies) That Are Never Used. """
+
+    def __init__(self, kind: str, group: str):
+        self.kind = kind  # Kind of component for error messages (e.g. "Stage")
+        self.group = group  # Group of entry points of third-party components
+        self.classes = {}  # Registered classes by name
+        self.modules = {}  # Modules that are not imported yet by the names of the components they define
+        self.entry_points = None  # Entry points by name (read on first lookup of an unknown name)
+
+    # Decorator that registers class under its own name (or under name)
+    def register(self, component=None, name: str = None):
+        def decorator(component_class):
+            self.classes[name or component_class.__name__] = component_class
+            return component_class
+        if component is None:
+            return decorator
+        return decorator(component)
+
+    # Import module (relative to lib) when one of names is looked up
+    def add_module(self, module: str, names: list):
+        for name in names:
+            self.modules[name] = module
+
+    # Return class registered under name
+    def get(self, name: str):
+        if name not in self.classes and name in self.modules:
+            importlib.import_module(self.modules.pop(name), __package__)
+        if name not in self.classes:
+            entry_point = self._get_entry_points().get(name)
+            if entry_point is not None:
+                self.classes[name] = entry_point.load()
+        if name not in self.classes:
+            raise Exception('Unknown %s "%s". Known: %s.' % (self.kind, name, ", ".join(self.get_names())))
+        return self.classes[name]
+
+    # Return names of all known components (without importing them)
+    def get_names(self):
+        return sorted(set(self.classes) | set(self.modules) | set(self._get_entry_points()))
+
+    def _get_entry_points(self):
+        if self.entry_points is None:
+            from importlib import metadata  # (Slow to import, only needed for unknown names)
+            self.entry_points = {entry_point.name: entry_point
+                                 for entry_point in metadata.entry_points(group=self.group)}
+        return self.entry_points
+
+
+stages = Registry("Stage", "brutus.stages")
+harvesters = Registry("Harvester", "brutus.harvesters")
+samplers = Registry("Sampler", "brutus.samplers")
+
+# Built-in components (modules are imported on first use)
+stages.add_module(".stages", ["File", "FileELF", "FileJPEG", "Noise", "HeaderJPEG", "Split", "SaveHashes",
+                              "DiskImage", "DirectImage", "SendTCP", "SendUDP"])
+harvesters.add_module(".FileHarvester", ["FileHarvester"])
+samplers.add_module(".DiskImageSampler", ["DiskImageSampler"])
+samplers.add_module(".OnlineImageSampler", ["OnlineImageSampler"])
+
+register_stage = stages.register
+register_harvester = harvesters.register
+register_sampler = samplers.register
+
+
+# Import plugin modules (absolute module names), their components register themselves
+def load_plugins(modules: list):
+    for module in modules:
+        importlib.import_module(module)
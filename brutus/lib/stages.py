@@ -1,8 +1,11 @@
-import magic
 import os
 import hashlib
-import struct
-from .core import Stage
+import itertools
+from .core import Stage, make_writable, iter_contents, join_pieces
+from .ChunkHasher import ChunkHasher
+from .NetworkSink import TCPSender, UDPSender, acquire_sender, release_sender
+from .FileTypeDetector import detector
+from .registry import register_stage, samplers
 
 """
 Stage Subclasses:
@@ -13,7 +16,8 @@ Stage Subclasses:
         Split
     SaveHashes
     Processed,
-        DiskImage, SendTCP, SendUDP
+        DiskImage, DirectImage, SendTCP,
+            SendUDP
 """
 
 
@@ -25,9 +29,15 @@ Stages:
     Noise
 """
 
+@register_stage
 class File(Stage):
     """ Initiating Stage for Reading in a General File. """
 
+    # Number of bytes read at once if file is streamed
+    BLOCK_SIZE = 2**20
+    io_bound = True
+    initiating = True
+
     def __init__(self, args):
         Stage.__init__(self, args)
         self.file_content = None
@@ -35,10 +45,45 @@ class File(Stage):
         self.file_type = None
         # Processed content is saved separately
         self.proc_content = None
+        # If True, file is passed on in blocks of BLOCK_SIZE instead of being read in as a whole
+        self.stream = False
 
     # Initiate pipeline processing
     def start(self):
-        self.proc_content = self.process([self.file_content], self.object_name, self.contents_path)
+        if self.stream:
+            # Processed blocks are not kept, so there is no processed content
+            self.proc_content = None
+            self.process_stream(iter(()), self.object_name, self.contents_path)
+        else:
+            self.proc_content = self.process([self.file_content], self.object_name, self.contents_path)
+        self._record_file()
+
+    # Initiate pipeline processing within an event loop (I/O-bound stages are run by executor)
+    async def start_async(self, executor):
+        if self.stream:
+            # Reading, processing and writing of blocks are interleaved, so the whole stream runs in executor
+            self.proc_content = None
+            import asyncio  # (Already loaded by the running event loop)
+            await asyncio.get_running_loop().run_in_executor(executor, self.process_stream, iter(()),
+                                                             self.object_name, self.contents_path)
+        else:
+            self.proc_content = await self.process_async([self.file_content], self.object_name,
+                                                         self.contents_path, executor)
+        self._record_file()
+
+    # Record hash of processed file for the manifest (contents of direct pipelines are not stored)
+    def _record_file(self):
+        if self.chunk_store is None:
+            return
+        stage = self.next_stage
+        while stage is not None:
+            if stage.direct:
+                return
+            stage = stage.next_stage
+        self.chunk_store.add_file(os.path.abspath(self.object_name), self.get_hash())
+
+    def set_stream(self, stream):
+        self.stream = stream
 
     def get_hash(self):
         return self.file_hash.hexdigest()
@@ -46,22 +91,53 @@ class File(Stage):
     def get_type(self):
         return self.file_type
 
+    # Set type of next file if it is already known (e.g. determined by Harvester)
+    def set_type(self, file_type):
+        self.file_type = file_type
+
     def output(self):
         return self.proc_content
 
     def _do_pre(self, contents):
         #print("File _do_pre")  # TRACING
         with open(self.object_name, mode='rb') as file:
-            self.file_content = file.read()  # Read in whole file in binary mode
-            self.file_hash = hashlib.sha256(self.file_content)  # (Not important for now)
-        # Determine type for input file
-        with magic.Magic() as m:
-            self.file_type = m.id_filename(self.object_name)
-        # Contents need to be a list of bytearrays to do modification
-        byte_stream = bytearray(self.file_content)
+            # Read in whole file in binary mode directly into one buffer
+            buffer = bytearray(os.fstat(file.fileno()).st_size)
+            size = file.readinto(buffer)
+        # Following stages only work on views of this buffer
+        self.file_content = memoryview(buffer)[:size]
+        self.file_hash = hashlib.sha256(self.file_content)  # (Not important for now)
+        # Determine type for input file if it hasn't been passed on by Harvester
+        if self.file_type is None:
+            self.file_type = detector.id_buffer(self.file_content)
         contents = []
-        contents.append(byte_stream)
-        return contents  # Return list of bytearrays
+        contents.append(self.file_content)
+        return contents  # Return list of memoryviews
+
+    # Read file block by block and pass on each block as a piece of one content (the whole file is never held
+    # in memory). The next block is read before a block is passed on, so the last block is known.
+    def _do_stream(self, pieces):
+        self.file_hash = hashlib.sha256()  # Hash is updated incrementally
+        with open(self.object_name, mode='rb') as file:
+            block = self._read_block(file)
+            while True:
+                next_block = self._read_block(file)
+                last = len(next_block) == 0
+                for piece in self._do_post(self._do_main([block])):
+                    yield piece, last
+                if last:
+                    break
+                block = next_block
+
+    def _read_block(self, file):
+        block = bytearray(self.BLOCK_SIZE)
+        size = file.readinto(block)
+        block = memoryview(block)[:size]
+        self.file_hash.update(block)
+        # Determine type for input file by first block if it hasn't been passed on by Harvester
+        if self.file_type is None and size > 0:
+            self.file_type = detector.id_buffer(block)
+        return block
 
     def _do_main(self, contents):
         #print("File _do_main")  # TRACING
@@ -72,9 +148,12 @@ class File(Stage):
         return contents
 
 
+@register_stage
 class FileELF(File):
     """ Class for ELF Binary. """
 
+    only_file_type = "ELF"
+
     def __init__(self, args):
         File.__init__(self, args)
 
@@ -94,9 +173,12 @@ class FileELF(File):
         return contents
 
 
+@register_stage
 class FileJPEG(File):
     """ Class for JPEG Binary. """
 
+    only_file_type = "JPEG"
+
     def __init__(self, args):
         File.__init__(self, args)
 
@@ -116,17 +198,55 @@ class FileJPEG(File):
         return contents
 
 
+@register_stage
 class Noise(File):
-    """ Class for Setting Noise in File. """
+    """ Class for Setting Noise in File.
+    Noise models (optionally followed by a seed):
+        [offset] or ["zero", offset] - write 0 to every offset-th byte
+        ["flip", rate] - replace each byte by a random byte with probability rate
+        ["burst", count, length] - overwrite count random areas of length bytes with random bytes
+    The random stream of each content is derived from the seed, the content name and the number of the content,
+    so the noise of a file doesn't depend on which worker or linked list of stages processes it. """
+
+    blockwise = True
+    io_bound = False
+    initiating = False
+    transform = True
+    # Number of bytes of a content that share one random stream of the "flip" model
+    # (flips only depend on their position in the content)
+    WINDOW_SIZE = 2**16
 
     def __init__(self, args):
         File.__init__(self, args)
-        if len(self.args) == 0:
+        args = list(self.args)
+        self.model = "zero"
+        if len(args) > 0 and isinstance(args[0], str):
+            self.model = args.pop(0)
+        # Number of parameters of each noise model (a seed may follow)
+        num_parameters = {"zero": 1, "flip": 1, "burst": 2}
+        if self.model not in num_parameters:
+            raise Exception('Unknown noise model "%s" in "Noise".' % self.model)
+        if len(args) > num_parameters[self.model] + 1:
+            raise Exception('Too many arguments in "Noise".')
+
+        if self.model == "zero":
             self.offset = 100  # Write 0 to every 100th byte in each content by default
-        elif len(self.args) == 1:
-            self.offset = self.args[0]  # Parameter is byte distance between zeros
+            if len(args) > 0:
+                self.offset = args[0]  # Parameter is byte distance between zeros
+        elif self.model == "flip":
+            self.rate = args[0]  # Probability of each byte to be flipped
+        elif self.model == "burst":
+            self.count = args[0]  # Number of bursts in each content
+            self.length = args[1]  # Number of bytes of each burst
+        import numpy  # Imported on first use (only pipelines with noise need it)
+        if len(args) > num_parameters[self.model]:
+            self.seed = args[num_parameters[self.model]]
         else:
-            raise Exception('Too many arguments in "Noise".')
+            self.seed = numpy.random.SeedSequence().entropy  # Random noise
+        # Name of file whose contents are processed, stable hash of its content name and number of last content
+        self.noise_name = None
+        self.name_key = 0
+        self.content_number = 0
 
     def _do_pre(self, contents):
         #print("Noise _do_pre")  # TRACING
@@ -135,27 +255,83 @@ class Noise(File):
     def _do_main(self, contents):
         #print("Noise _do_main")  # TRACING
         for idx, content in enumerate(contents):
-            current_byte = self.offset - 1
-            while current_byte < len(content):
-                # (Equal to 'contents[idx][current_byte] = 0')
-                struct.pack_into('b', contents[idx], current_byte, 0)
-                current_byte += self.offset
-        return contents
+            # Content is copied before it is modified
+            contents[idx] = content = make_writable(content)
+            self._add_noise(content, 0, self._next_content_number())
+        return contents
+
+    # Add noise to each piece at its position in its content, so the same bytes are modified as in a list
+    def _do_stream(self, pieces):
+        if self.model == "burst":
+            # Bursts are spread over the whole content
+            yield from Stage._do_stream(self, pieces)
+            return
+        for content in iter_contents(pieces):
+            number = self._next_content_number()
+            position = 0
+            for piece, last in content:
+                piece = make_writable(piece)
+                self._add_noise(piece, position, number)
+                position += len(piece)
+                yield piece, last
 
     def _do_post(self, contents):
         #print("Noise _do_post")  # TRACING
         return contents
 
+    # Return number of next content of current file
+    def _next_content_number(self):
+        if self.object_name != self.noise_name:
+            self.noise_name = self.object_name
+            name = self.get_content_name().encode("utf-8", "surrogateescape")
+            self.name_key = int.from_bytes(hashlib.sha256(name).digest()[:8], "little")
+            self.content_number = 0
+        self.content_number += 1
+        return self.content_number
+
+    # Modify bytes of piece in place. The piece starts at position of content with number.
+    def _add_noise(self, piece, position, number):
+        import numpy
+        # Modify bytes in place by NumPy view of piece
+        data = numpy.frombuffer(piece, dtype=numpy.uint8)
+        if len(data) == 0:
+            return
+        if self.model == "zero":
+            # Zeros continue at the position of the piece
+            data[(self.offset - 1 - position) % self.offset::self.offset] = 0
+        elif self.model == "flip":
+            for window in range(position // self.WINDOW_SIZE, (position + len(data) - 1) // self.WINDOW_SIZE + 1):
+                rng = numpy.random.default_rng([self.seed, self.name_key, number, window])
+                num_flips = rng.binomial(self.WINDOW_SIZE, self.rate)
+                positions = rng.integers(0, self.WINDOW_SIZE, num_flips) + window * self.WINDOW_SIZE - position
+                # XOR with non-zero values makes sure that flipped bytes change
+                values = rng.integers(1, 256, num_flips, dtype=numpy.uint8)
+                within = (positions >= 0) & (positions < len(data))
+                data[positions[within]] ^= values[within]
+        elif self.model == "burst":
+            # Bursts are spread over the whole content
+            rng = numpy.random.default_rng([self.seed, self.name_key, number])
+            length = min(self.length, len(data))
+            starts = rng.integers(0, len(data) - length, self.count, endpoint=True)
+            positions = (starts[:, numpy.newaxis] + numpy.arange(length)).ravel()
+            data[positions] = rng.integers(0, 256, len(positions), dtype=numpy.uint8)
+
 
 """
 Stages:
     HeaderJPEG
 """
 
+@register_stage
 class HeaderJPEG(FileJPEG):
     """ Class for Removing First 100 Bytes from JPEG File.
     This Only Makes Sense If File Is Not Already Split. """
 
+    io_bound = False
+    initiating = False
+    whole_file = True
+    transform = True
+
     def __init__(self, args):
         FileJPEG.__init__(self, args)
 
@@ -165,10 +341,23 @@ class HeaderJPEG(FileJPEG):
 
     def _do_main(self, contents):
         #print("HeaderJPEG _do_main")  # TRACING
-        # Remove first 100 bytes (of each content)
-        for content in contents:
-            del content[:100]
-        return contents
+        # Remove first 100 bytes (of each content) without copying
+        return [memoryview(content)[100:] for content in contents]
+
+    # Remove first 100 bytes of each streamed content
+    def _do_stream(self, pieces):
+        remaining = 100
+        for piece, last in pieces:
+            piece = memoryview(piece)
+            if remaining > 0:
+                removed = min(remaining, len(piece))
+                piece = piece[removed:]
+                remaining -= removed
+            # Empty pieces are only passed on if they end a content
+            if len(piece) > 0 or last:
+                yield piece, last
+            if last:
+                remaining = 100
 
     def _do_post(self, contents):
         #print("HeaderJPEG _do_post")  # TRACING
@@ -184,6 +373,8 @@ Stages:
 class Fragment(Stage):
     """ Class for a Fragment. """
 
+    blockwise = True
+
     def __init__(self, args):
         Stage.__init__(self, args)
         self.header = None
@@ -206,9 +397,12 @@ class Fragment(Stage):
         return contents
 
 
+@register_stage
 class Split(Fragment):
     """ Class for Splitting File Content into Byte Blocks. """
 
+    splitting = True
+
     def __init__(self, args):
         Fragment.__init__(self, args)
         if len(self.args) == 0:
@@ -225,13 +419,36 @@ class Split(Fragment):
     def _do_main(self, contents):
         #print("Split _do_main")  # TRACING
 
-        # Split content into byte blocks
+        # Split content into byte blocks (blocks are views, so no bytes are copied)
         new_contents = []
         for content in contents:
-            for i in range(0, len(content), self.size):
-                new_contents.append(content[i:i + self.size])
-
-        return new_contents  # Return list of bytearrays
+            view = memoryview(content)
+            for i in range(0, len(view), self.size):
+                new_contents.append(view[i:i + self.size])
+
+        return new_contents  # Return list of memoryviews
+
+    # Split each streamed content into chunks of split size (each chunk is a content of its own)
+    def _do_stream(self, pieces):
+        pending = bytearray()  # Bytes of a chunk that is continued by the next piece
+        for piece, last in pieces:
+            view = memoryview(piece)
+            position = 0
+            if len(pending) > 0:
+                position = min(self.size - len(pending), len(view))
+                pending += view[:position]
+                if len(pending) == self.size:
+                    yield pending, True
+                    pending = bytearray()
+            # Whole chunks within piece are passed on as views
+            while position + self.size <= len(view):
+                yield view[position:position + self.size], True
+                position += self.size
+            pending += view[position:]
+            # Chunks don't span contents
+            if last and len(pending) > 0:
+                yield pending, True
+                pending = bytearray()
 
     def _do_post(self, contents):
         #print("Split _do_post")  # TRACING
@@ -243,11 +460,25 @@ Stages:
     SaveHashes
 """
 
+@register_stage
 class SaveHashes(Stage):
-    """ Class for Creating Text File to Save Hashes After File Has Been Split. """
+    """ Class for Saving Hashes of Chunks After File Has Been Split.
+    Optional arguments: hash algorithm (default "sha256") and number of hashing threads,
+    e.g. ["blake2b", 4]. """
+
+    blockwise = True
+    # Maximum number of streamed contents that are hashed at once
+    BATCH_SIZE = 64
 
     def __init__(self, args):
         Stage.__init__(self, args)
+        algorithm = "sha256"
+        num_threads = None  # One thread per CPU core
+        if len(args) > 0:
+            algorithm = args[0]
+        if len(args) > 1:
+            num_threads = args[1]
+        self.hasher = ChunkHasher(algorithm, num_threads)
 
     def _do_pre(self, contents):
         #print("SaveHashes _do_pre")  # TRACING
@@ -255,22 +486,42 @@ class SaveHashes(Stage):
 
     def _do_main(self, contents):
         #print("SaveHashes _do_main")  # TRACING
-        # Folder where hashes are saved in text files
-        hashes_path = os.path.join(self.contents_path, "SHA-256 hashes")
-        # Create "SHA-256 hashes" folder for saving hashes of chunks
-        if not os.path.exists(hashes_path):
-            os.makedirs(hashes_path)
-
-        filename = self.object_name.split('/')[-1]  # Extract filename from path
-        filename += ".txt"
-
-        # Write hashes of chunks into text file
-        with open(os.path.join(hashes_path, filename), 'a') as hashes_file:
-            for content in contents:
-                hashed_content = hashlib.sha256(content).hexdigest()
-                hashes_file.write(hashed_content + '\n')
-
-        return contents
+        # Hashes of chunks are kept by the chunk store and written to its index along with the chunks
+        hashes = self.hasher.hash_all(contents)
+        self.chunk_store.add_hashes(self.get_content_name(), hashes, self.hasher.algorithm_id)
+        return contents
+
+    # Hash streamed contents. Hashes of whole pieces are batched, contents of several pieces are hashed
+    # incrementally. Each hash is kept before the last piece of its content is passed on.
+    def _do_stream(self, pieces):
+        content_name = self.get_content_name()
+        algorithm = self.hasher.algorithm_id
+        batch = []
+        number = 0  # Number of contents that have been hashed
+        for content in iter_contents(pieces):
+            piece, last = next(content)
+            if last:
+                batch.append(piece)
+                if len(batch) < self.BATCH_SIZE:
+                    continue
+            # Contents are passed on in order, so batch is hashed first
+            self.chunk_store.add_hashes(content_name, self.hasher.hash_all(batch), algorithm, number + 1)
+            number += len(batch)
+            for batched in batch:
+                yield batched, True
+            batch = []
+            if last:
+                continue
+            content_hash = self.hasher.new()
+            for piece, last in itertools.chain([(piece, last)], content):
+                content_hash.update(piece)
+                if last:
+                    number += 1
+                    self.chunk_store.add_hashes(content_name, [content_hash.digest()], algorithm, number)
+                yield piece, last
+        self.chunk_store.add_hashes(content_name, self.hasher.hash_all(batch), algorithm, number + 1)
+        for batched in batch:
+            yield batched, True
 
     def _do_post(self, contents):
         #print("SaveHashes _do_post")  # TRACING
@@ -281,6 +532,7 @@ class SaveHashes(Stage):
 Stages:
     Processed
     DiskImage
+    DirectImage
     SendTCP
     SendUDP
 """
@@ -288,6 +540,9 @@ Stages:
 class Processed(Stage):
     """ The Major Processed Class to End a Pipeline Processing. """
 
+    blockwise = True
+    sink = True
+
     def __init__(self, args):
         Stage.__init__(self, args)
 
@@ -303,9 +558,27 @@ class Processed(Stage):
         #print("Processed _do_post")  # TRACING
         return contents
 
+    # True if a following stage also writes or sends the chunks (so it needs their hashes, too)
+    def _keeps_hashes(self):
+        stage = self.next_stage
+        while stage is not None:
+            if isinstance(stage, Processed):
+                return True
+            stage = stage.next_stage
+        return False
+
+    # Return (hash, algorithm) SaveHashes has kept for chunk (the last of several stages forgets it)
+    def _take_hash(self, content_name, number):
+        if self._keeps_hashes():
+            return self.chunk_store.get_hash(content_name, number)
+        return self.chunk_store.pop_hash(content_name, number)
 
+
+@register_stage
 class DiskImage(Processed):
-    """ Class for Writing Contents to Disk Storage. """
+    """ Class for Writing Contents to Chunk Store on Disk Storage. """
+
+    io_bound = True
 
     def __init__(self, args):
         Processed.__init__(self, args)
@@ -317,52 +590,158 @@ class DiskImage(Processed):
     def _do_main(self, contents):
         #print("DiskImage _do_main")  # TRACING
 
-        # Write single processed contents of file to contents path
-        content_number = 1
+        # Append single processed contents of file to chunk store of pipeline
+        content_name = self.get_content_name()
         #print("-> Creating contents for", self.object_name)  # TRACING
-        for content in contents:
-            # Content name is the filename with a number that follows an underscore (i.e. filename.jpg_1)
-            content_name = "%s_%d" % (self.object_name.split('/')[-1], content_number)
+        for content_number, content in enumerate(contents, 1):
+            self.chunk_store.append(content_name, content_number, content, self._keeps_hashes())
+
+        return contents
+
+    # Append each piece to chunk store as soon as it arrives (the pieces of a content make up one chunk)
+    def _do_stream(self, pieces):
+        content_name = self.get_content_name()
+        for content_number, content in enumerate(iter_contents(pieces), 1):
+            yield from self.chunk_store.write_pieces(content_name, content_number, content, self._keeps_hashes())
+
+    def _do_post(self, contents):
+        #print("DiskImage _do_post")  # TRACING
+        return contents
+
 
-            with open(os.path.join(self.contents_path, content_name), 'wb') as file:
-                file.write(content)
+@register_stage
+class DirectImage(Processed):
+    """ Class for Writing Contents Directly into the Image of the OnlineImageSampler
+    (Without Storing Them in the Contents Folder). Only Works in Pipelines That Run as Threads. """
 
-            content_number += 1
+    io_bound = True
+    direct = True
+
+    def __init__(self, args):
+        Processed.__init__(self, args)
 
+    def _do_pre(self, contents):
+        #print("DirectImage _do_pre")  # TRACING
         return contents
 
+    def _do_main(self, contents):
+        #print("DirectImage _do_main")  # TRACING
+        self._place(1, contents)
+        return contents
+
+    # Place each content as soon as all its pieces have arrived (merged chunks of a file are placed together).
+    # The size of a content has to be known before it is placed, so its pieces are held until its last piece.
+    def _do_stream(self, pieces):
+        if self._get_sampler().merge_chunks:
+            contents = [join_pieces(content) for content in iter_contents(pieces)]
+            for content in self._do_all(contents):
+                yield content, True
+            return
+        for content_number, content in enumerate(iter_contents(pieces), 1):
+            content = join_pieces(content)
+            self._place(content_number, [content])
+            yield content, True
+
     def _do_post(self, contents):
-        #print("DiskImage _do_post")  # TRACING
+        #print("DirectImage _do_post")  # TRACING
         return contents
 
+    def _place(self, first_number, contents):
+        content_name = self.get_content_name()
+        hashes = [self._take_hash(content_name, number) for number in range(first_number,
+                                                                             first_number + len(contents))]
+        self._get_sampler().place(content_name, first_number, contents, hashes)
 
+    @staticmethod
+    def _get_sampler():
+        sampler = samplers.get("OnlineImageSampler").current
+        if sampler is None:
+            raise Exception('DirectImage needs the sampler option "direct":[true].')
+        if sampler.pid != os.getpid():
+            raise Exception("DirectImage only works in pipelines that run as threads (not with workers).")
+        return sampler
+
+
+@register_stage
 class SendTCP(Processed):
-    """ Class for Sending Contents over TCP. """
+    """ Class for Sending Contents over TCP.
+    Arguments: host, port and optionally number of pooled connections, minimum size of a batched write
+    and maximum size of send buffer in bytes, e.g. ["127.0.0.1", 9000, 2, 262144, 16777216].
+    Connections are shared by all stages of a process that send to the same destination. """
+
+    io_bound = True
 
     def __init__(self, args):
         Processed.__init__(self, args)
+        if len(args) < 2:
+            raise Exception("SendTCP needs host and port.")
+        self.sender = None  # Connected on first content
 
     def _do_pre(self, contents):
+        #print("SendTCP _do_pre")  # TRACING
         return contents
 
     def _do_main(self, contents):
+        #print("SendTCP _do_main")  # TRACING
+        content_name = self.get_content_name()
+        for content_number, content in enumerate(contents, 1):
+            self._send(content_name, content_number, content)
         return contents
 
+    # Send each content as soon as all its pieces have arrived
+    # (the size of a content is sent before its bytes, so its pieces are held until its last piece)
+    def _do_stream(self, pieces):
+        content_name = self.get_content_name()
+        for content_number, content in enumerate(iter_contents(pieces), 1):
+            content = join_pieces(content)
+            self._send(content_name, content_number, content)
+            yield content, True
+
     def _do_post(self, contents):
+        #print("SendTCP _do_post")  # TRACING
         return contents
 
+    # Send chunk with its hash in the frame
+    def _send(self, content_name, content_number, content):
+        chunk_hash, algorithm = self._take_hash(content_name, content_number)
+        self._get_sender().send(content_name, content_number, content, chunk_hash, algorithm)
+
+    # Flush buffered contents (connections are closed by last stage using them)
+    def close(self):
+        if self.sender is not None:
+            release_sender(self.sender)
+            self.sender = None
+        Processed.close(self)
+
+    def _get_sender(self):
+        if self.sender is None:
+            self.sender = acquire_sender(TCPSender, *self.args)
+        return self.sender
+
 
-class SendUDP(Processed):
-    """ Class for Sending Contents over UDP. """
+@register_stage
+class SendUDP(SendTCP):
+    """ Class for Sending Contents over UDP.
+    Arguments: host, port and optionally maximum datagram size in bytes, rate in MB/s (0 means unlimited)
+    and maximum size of send buffer in bytes, e.g. ["127.0.0.1", 9000, 1400, 100].
+    Chunks are split into datagrams, small chunks share datagrams. """
 
     def __init__(self, args):
-        Processed.__init__(self, args)
+        SendTCP.__init__(self, args)
 
     def _do_pre(self, contents):
+        #print("SendUDP _do_pre")  # TRACING
         return contents
 
     def _do_main(self, contents):
-        return contents
+        #print("SendUDP _do_main")  # TRACING
+        return SendTCP._do_main(self, contents)
 
     def _do_post(self, contents):
+        #print("SendUDP _do_post")  # TRACING
         return contents
+
+    def _get_sender(self):
+        if self.sender is None:
+            self.sender = acquire_sender(UDPSender, *self.args)
+        return self.sender
@@ -0,0 +1,49 @@
+import pytest
+from lib.Compiler import ExecutionPlan, is_identity, validate_pipeline
+from lib.stages import FileELF, FileJPEG, HeaderJPEG, Noise, SaveHashes, DiskImage
+
+
+def test_valid_pipelines_pass():
+    validate_pipeline({"stages": [{"FileJPEG": []}, {"HeaderJPEG": []}, {"Split": [2000]}, {"SaveHashes": []},
+                                  {"DiskImage": []}]}, "JPEG")
+    validate_pipeline({"stages": [{"File": []}, {"SendTCP": ["127.0.0.1", 9000]}]}, "PDF")
+    validate_pipeline({"stages": [{"FileELF": []}, {"DirectImage": []}]}, "ELF", direct=True)
+
+
+@pytest.mark.parametrize("stages, file_type, direct, message", [
+    ([], "PDF", False, "non-empty"),
+    ([{"Split": []}, {"DiskImage": []}], "PDF", False, "has to start"),
+    ([{"File": []}, {"File": []}, {"DiskImage": []}], "PDF", False, "only be the first"),
+    ([{"FileJPEG": []}, {"Split": []}, {"HeaderJPEG": []}, {"DiskImage": []}], "JPEG", False, "already been split"),
+    ([{"File": []}, {"SaveHashes": []}], "PDF", False, "writes or sends"),
+    ([{"File": []}, {"DirectImage": []}], "PDF", False, '"direct"'),
+    ([{"FileJPEG": []}, {"DiskImage": []}], "ELF", False, "only works on JPEG"),
+    ([{"File": []}, {"HeaderJPEG": []}, {"DiskImage": []}], "PDF", False, "only works on JPEG"),
+    ([{"FileELF": []}, {"DiskImage": []}], "JPEG", False, "only works on ELF"),
+    ([{"File": []}, {"Noise": ["wave", 3]}, {"DiskImage": []}], "PDF", False, "Invalid arguments"),
+    ([{"File": []}, {"Split": [1, 2]}, {"DiskImage": []}], "PDF", False, "Invalid arguments"),
+    ([{"File": []}, {"Unknown": []}, {"DiskImage": []}], "PDF", False, "Unknown Stage"),
+])
+def test_invalid_pipelines_are_rejected(stages, file_type, direct, message):
+    with pytest.raises(Exception, match=message):
+        validate_pipeline({"stages": stages}, file_type, direct)
+
+
+def test_direct_image_needs_threads():
+    with pytest.raises(Exception, match="workers"):
+        validate_pipeline({"stages": [{"File": []}, {"DirectImage": []}], "workers": [2]}, "PDF", direct=True)
+
+
+def test_pass_through_hooks_are_dropped():
+    for stage_class in (FileELF, FileJPEG):
+        stage = stage_class([])
+        assert [is_identity(getattr(stage, "_do_" + phase)) for phase in ("pre", "main", "post")] == \
+            [False, True, True]
+    stages = [FileJPEG([]), HeaderJPEG([]), Noise([10]), SaveHashes([]), DiskImage([])]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.add_stage(next_stage)
+    plan = ExecutionPlan(stages[0])
+    # File is only read in, HeaderJPEG and Noise are fused
+    assert [[phase for phase, hook in step.hooks] for step in plan.steps if hasattr(step, "stage")] == \
+        [["pre"], ["main"], ["main"]]
+    assert [len(step.hooks) for step in plan.steps if not hasattr(step, "stage")] == [2]
@@ -0,0 +1,78 @@
+import os
+import json
+import pytest
+from lib.OnlineImageSampler import OnlineImageSampler
+from lib.FileHarvester import FileHarvester
+
+
+# Place chunks of two files (as two DirectImage stages would) and return sampler after generating image
+def place_files(tmp_path, merge_chunks, expected_size=200000, **options):
+    sampler = OnlineImageSampler(1, str(tmp_path), str(tmp_path), merge_chunks, expected_size=expected_size, seed=3,
+                                 **options)
+    sampler.WINDOW_CHUNKS = 16
+    for name in ("00000000_a", "00000000_b"):
+        contents = [bytes([ord(name[-1]), number]) * 500 for number in range(1, 101)]
+        sampler.place(name, 1, contents, [(b'', 0)] * len(contents))
+    sampler.generate_image()
+    return sampler
+
+
+# Return all chunks of sampler sorted by offset
+def get_chunks(sampler):
+    chunks = sampler.all_chunks + [chunk for file in sampler.files for chunk in file.get_chunks()]
+    return sorted(chunks, key=lambda chunk: chunk.offset)
+
+
+# Check that chunks don't overlap and each chunk is found at its offset
+def check_image(tmp_path, chunks):
+    with open(os.path.join(str(tmp_path), "Disk Image", "disk_image.img"), 'rb') as image_file:
+        image = image_file.read()
+    for chunk, next_chunk in zip(chunks, chunks[1:]):
+        assert chunk.offset + len(chunk) <= next_chunk.offset
+    for chunk in chunks:
+        assert image[chunk.offset:chunk.offset + len(chunk)] == bytes([ord(chunk.filename), chunk.pos_number]) * 500
+    return image
+
+
+def test_chunks_are_interleaved_in_random_order(tmp_path):
+    sampler = place_files(tmp_path, False)
+    chunks = get_chunks(sampler)
+    assert len(chunks) == 200
+    layout = [(chunk.filename, chunk.pos_number) for chunk in chunks]
+    assert layout != sorted(layout)
+    check_image(tmp_path, chunks)
+
+
+def test_merged_files_stay_whole(tmp_path):
+    sampler = place_files(tmp_path, True)
+    for file in sampler.files:
+        chunks = file.get_chunks()
+        assert [chunk.pos_number for chunk in chunks] == list(range(1, 101))
+        for chunk, next_chunk in zip(chunks, chunks[1:]):
+            assert chunk.offset + len(chunk) == next_chunk.offset
+
+
+@pytest.mark.parametrize("merge_chunks", [False, True])
+@pytest.mark.parametrize("background", ["random", "zero"])
+def test_contents_are_spread_if_estimate_was_too_large(merge_chunks, background, tmp_path):
+    # Expected size leaves no space for gaps, so contents are first laid out one after another
+    sampler = place_files(tmp_path, merge_chunks, 10**6, background=background)
+    chunks = get_chunks(sampler)
+    assert chunks[-1].offset > 500000
+    image = check_image(tmp_path, chunks)
+    if background == "zero":
+        # No moved content is left in the gaps
+        assert image.count(0) == len(image) - 200000
+    # Seed doesn't regenerate layout of a direct image
+    with open(os.path.join(str(tmp_path), "Disk Image", "parameters.json")) as parameters_file:
+        assert json.load(parameters_file)["direct"] == [True]
+
+
+def test_expected_size_only_counts_harvested_files(tmp_path, monkeypatch):
+    for name, size in (("a.pdf", 1000), ("b.pdf", 500), ("c.txt", 10**6)):
+        with open(str(tmp_path / name), 'wb') as file:
+            file.write(bytes(size))
+    # (Type is known without libmagic)
+    monkeypatch.setattr(FileHarvester, "_detect", staticmethod(
+        lambda filename: (filename, "PDF document" if filename.endswith(".pdf") else "ASCII text")))
+    assert FileHarvester(str(tmp_path), ["PDF"]).get_expected_size() == 1500
@@ -0,0 +1,35 @@
+from lib.ChunkHasher import ChunkHasher
+
+
+def test_each_number_of_threads_gets_its_own_pool():
+    small = ChunkHasher("sha256", 2)
+    large = ChunkHasher("sha256", 8)
+    assert small._get_executor()._max_workers == 2
+    assert large._get_executor()._max_workers == 8
+    assert ChunkHasher("sha256", 2)._get_executor() is small._get_executor()
+
+
+def test_parallel_and_incremental_hashes_match():
+    contents = [bytes([i]) * 300000 for i in range(8)]
+    for algorithm in ("sha256", "blake2b", "crc32"):
+        hasher = ChunkHasher(algorithm, 4)
+        hashes = hasher.hash_all(contents)
+        assert hashes == [hasher.hash(content) for content in contents]
+        content_hash = hasher.new()
+        content_hash.update(contents[0][:1000])
+        content_hash.update(contents[0][1000:])
+        assert content_hash.digest() == hashes[0]
+
+
+def test_slices_keep_order_of_contents():
+    contents = [bytes([i]) * (1000 + i) for i in range(7)]
+    hasher = ChunkHasher("sha256", 3)
+    assert hasher.hash_parallel(contents) == [hasher.hash(content) for content in contents]
+
+
+def test_small_chunks_are_hashed_in_calling_thread(monkeypatch):
+    hasher = ChunkHasher("sha256", 4)
+    monkeypatch.setattr(hasher, "hash_parallel", None)
+    # 2 MiB in chunks of 512 bytes
+    contents = [bytes([i % 256]) * 512 for i in range(4096)]
+    assert hasher.hash_all(contents) == [hasher.hash(content) for content in contents]
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+from lib.Initiate import Initiate
+from lib.Manifest import Manifest
+from lib.ChunkStore import ChunkStore
+from lib.stages import File, Split, DiskImage
+
+PIPELINES = [{"stages": [{"File": []}, {"DiskImage": []}]}, {"stages": [{"File": []}, {"DiskImage": []}]}]
+
+
+# Write files of source folder and return their paths
+def write_sources(source_path):
+    paths = []
+    for name, content in (("a.pdf", b'%PDF' * 100), ("b.jpg", b'\xff\xd8' * 100), ("c.txt", b'text')):
+        path = str(source_path / name)
+        with open(path, 'wb') as file:
+            file.write(content)
+        paths.append(path)
+    return paths
+
+
+# Save manifest of a session that processed files (text file has not been harvested)
+def save_session(manifest_path, paths, pipelines=PIPELINES):
+    manifest = Manifest(manifest_path, ["PDF", "JPEG"], pipelines)
+    for path, file_type in zip(paths, ("PDF", "JPEG", None)):
+        manifest.add(path, file_type, Manifest._hash_file(path) if file_type is not None else None)
+    manifest.save()
+
+
+def test_unchanged_files_are_skipped(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    paths = write_sources(source_path)
+    save_session(str(tmp_path / "manifest.json"), paths)
+    unchanged, outdated = Manifest(str(tmp_path / "manifest.json"), ["PDF", "JPEG"], PIPELINES).compare(
+        str(source_path))
+    assert unchanged == set(paths) and outdated == []
+
+
+def test_modified_and_deleted_files_are_outdated(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    paths = write_sources(source_path)
+    manifest_path = str(tmp_path / "manifest.json")
+    save_session(manifest_path, paths)
+    # Content of same size with a new modification time is detected by its hash
+    with open(paths[0], 'wb') as file:
+        file.write(b'%PDX' * 100)
+    os.utime(paths[0], ns=(0, 0))
+    os.unlink(paths[1])
+    manifest = Manifest(manifest_path, ["PDF", "JPEG"], PIPELINES)
+    unchanged, outdated = manifest.compare(str(source_path))
+    assert unchanged == {paths[2]}
+    assert sorted(outdated) == sorted(paths[:2])
+    assert paths[1] not in manifest.files
+
+
+def test_touched_file_with_same_content_is_unchanged(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    paths = write_sources(source_path)
+    save_session(str(tmp_path / "manifest.json"), paths)
+    os.utime(paths[0], ns=(0, 0))
+    unchanged, outdated = Manifest(str(tmp_path / "manifest.json"), ["PDF", "JPEG"], PIPELINES).compare(
+        str(source_path))
+    assert unchanged == set(paths) and outdated == []
+
+
+def test_changed_pipeline_reruns_its_file_type(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    paths = write_sources(source_path)
+    save_session(str(tmp_path / "manifest.json"), paths)
+    pipelines = [PIPELINES[0], {"stages": [{"File": []}, {"Split": [512]}, {"DiskImage": []}]}]
+    unchanged, outdated = Manifest(str(tmp_path / "manifest.json"), ["PDF", "JPEG"], pipelines).compare(
+        str(source_path))
+    assert unchanged == {paths[0], paths[2]} and outdated == [paths[1]]
+
+
+def test_file_without_hash_is_processed_again(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    paths = write_sources(source_path)
+    manifest = Manifest(str(tmp_path / "manifest.json"), ["PDF", "JPEG"], PIPELINES)
+    manifest.add(paths[0], "PDF")  # (Pipeline of file has not finished)
+    manifest.add(paths[2], None)
+    manifest.save()
+    unchanged, outdated = Manifest(str(tmp_path / "manifest.json"), ["PDF", "JPEG"], PIPELINES).compare(
+        str(source_path))
+    assert unchanged == {paths[2]} and sorted(outdated) == sorted(paths[:2])
+
+
+def test_file_stage_records_hash_of_file(tmp_path):
+    path = write_sources(tmp_path)[0]
+    stages = [File([]), Split([128]), DiskImage([])]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.add_stage(next_stage)
+    for stream in (False, True):
+        chunk_store = ChunkStore(str(tmp_path), "store")
+        stages[0].set_chunk_store(chunk_store)
+        stages[0].set_stream(stream)
+        stages[0].set_type("PDF")
+        stages[0].set_name(path)
+        stages[0].set_contents_path(str(tmp_path))
+        stages[0].start()
+        stages[0].close()
+        chunk_store.close()
+        assert ChunkStore.read_files(str(tmp_path)) == {path: Manifest._hash_file(path)}
+        ChunkStore.clear_files(str(tmp_path))
+
+
+def test_stale_manifest_clears_store(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    paths = write_sources(source_path)
+    initiate = Initiate.__new__(Initiate)
+    initiate.harvest_path = str(source_path)
+    initiate.contents_path = str(tmp_path / "contents")
+    initiate.file_types = ["PDF", "JPEG"]
+    initiate.pipelines = PIPELINES
+    hashed_source = hashlib.sha256(bytes(str(source_path), "utf-8")).hexdigest()
+    contents_path = os.path.join(initiate.contents_path, "contents_" + hashed_source[:10])
+    os.makedirs(contents_path)
+    save_session(os.path.join(contents_path, "manifest.json"), paths)
+    chunk_store = ChunkStore(contents_path, "store")
+    chunk_store.append("00000000_old.pdf", 1, b'old')
+    chunk_store.add_file("/interrupted.pdf", "0" * 64)
+    chunk_store.close()
+    # Manifest of an older layout
+    with open(os.path.join(contents_path, "manifest.json")) as manifest_file:
+        manifest = json.load(manifest_file)
+    with open(os.path.join(contents_path, "manifest.json"), 'w') as manifest_file:
+        json.dump(dict(manifest, version=Manifest.VERSION - 1), manifest_file)
+
+    assert not initiate._has_session_run()
+    assert initiate.contents_path == contents_path
+    assert list(ChunkStore.read_index(contents_path)) == []
+    assert ChunkStore.read_files(contents_path) == {}
+    assert initiate.unchanged_files == set()
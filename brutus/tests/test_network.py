@@ -0,0 +1,70 @@
+import time
+import hashlib
+import threading
+import pytest
+from lib.ChunkStore import ChunkStore
+from lib.NetworkSink import TCPReceiver, UDPReceiver
+from lib.stages import File, Split, SaveHashes, SendTCP, SendUDP, DiskImage
+
+
+@pytest.fixture
+def received():
+    chunks = {}
+    sizes = []  # Sizes of received chunks and pieces
+    lock = threading.Lock()
+
+    def on_chunk(name, number, chunk, chunk_hash, algorithm):
+        with lock:
+            chunks[number] = (bytes(chunk), chunk_hash, algorithm)
+            sizes.append(len(chunk))
+
+    def on_piece(name, number, offset, length, piece, chunk_hash, algorithm):
+        with lock:
+            content, first_hash, first_algorithm = chunks.get(number, (bytearray(length), b'', 0))
+            content[offset:offset + len(piece)] = piece
+            if offset == 0:
+                first_hash, first_algorithm = chunk_hash, algorithm
+            chunks[number] = (content, first_hash, first_algorithm)
+            sizes.append(len(piece))
+
+    receivers = [TCPReceiver(0, on_chunk), UDPReceiver(0, on_piece)]
+    for receiver in receivers:
+        threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    yield chunks, sizes, [receiver.server_address[1] for receiver in receivers]
+    for receiver in receivers:
+        receiver.shutdown()
+        receiver.server_close()
+
+
+@pytest.mark.parametrize("sink", [SendTCP, SendUDP])
+@pytest.mark.parametrize("stream", [False, True])
+def test_chunks_are_sent_with_their_hashes(sink, stream, received, tmp_path):
+    chunks, sizes, (tcp_port, udp_port) = received
+    filename = str(tmp_path / "a.bin")
+    with open(filename, 'wb') as file:
+        file.write(bytes(i % 251 for i in range(10000)))
+    # Chunks are sent and written, the last of both stages forgets the hashes
+    port = tcp_port if sink is SendTCP else udp_port
+    stages = [File([]), Split([3000]), SaveHashes([]), sink(["127.0.0.1", port]), DiskImage([])]
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage.add_stage(next_stage)
+    chunk_store = ChunkStore(str(tmp_path), "store")
+    stages[0].set_chunk_store(chunk_store)
+    stages[0].set_stream(stream)
+    stages[0].set_type("data")
+    stages[0].set_name(filename)
+    stages[0].set_contents_path(str(tmp_path))
+    stages[0].start()
+    stages[0].close()
+    chunk_store.close()
+
+    # Last datagrams may still be on their way
+    deadline = time.perf_counter() + 5
+    while sum(sizes) < 10000 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert chunk_store.hashes == {}
+    assert [record[5] for record in ChunkStore.read_index(str(tmp_path))] == [chunks[i][1] for i in range(1, 5)]
+    for number in range(1, 5):
+        content, chunk_hash, algorithm = chunks[number]
+        assert len(content) == (3000 if number < 4 else 1000)
+        assert (chunk_hash, algorithm) == (hashlib.sha256(content).digest(), 1)
@@ -0,0 +1,29 @@
+from lib.stages import Noise
+
+
+# Return noised copy of content of file (processed by stage)
+def add_noise(stage, filename, content):
+    stage.set_name(filename)
+    return bytes(stage._do_main([bytearray(content)])[0])
+
+
+def test_zero_noise_writes_every_offset_th_byte():
+    noised = add_noise(Noise([10]), "/data/a.bin", b'\xff' * 100)
+    assert [i for i, byte in enumerate(noised) if byte == 0] == list(range(9, 100, 10))
+
+
+def test_seeded_noise_does_not_depend_on_order_of_files():
+    content = bytes(range(256)) * 1000
+    first = Noise(["flip", 0.01, 7])
+    second = Noise(["flip", 0.01, 7])
+    # Second stage has processed another file before (like a worker that got other files first)
+    add_noise(second, "/data/other.bin", content)
+    assert add_noise(first, "/data/a.bin", content) == add_noise(second, "/data/a.bin", content)
+    assert add_noise(first, "/data/b.bin", content) != add_noise(second, "/data/a.bin", content)
+
+
+def test_burst_noise_is_reproducible():
+    content = bytes(10000)
+    noised = add_noise(Noise(["burst", 3, 50, 1]), "/data/a.bin", content)
+    assert noised == add_noise(Noise(["burst", 3, 50, 1]), "/data/a.bin", content)
+    assert 0 < sum(byte != 0 for byte in noised) <= 150
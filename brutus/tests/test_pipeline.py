@@ -0,0 +1,64 @@
+import time
+import asyncio
+import pytest
+from lib.core import pipeline_by_file_type
+from lib.Pipeline import PipelineQueue, Pipeline
+from lib.FileHarvester import FileHarvester
+from lib.stages import File, DiskImage
+
+
+def test_full_queue_raises_once_consumer_has_exited(monkeypatch):
+    monkeypatch.setattr(PipelineQueue, "CHECK_INTERVAL", 0.01)
+    queue = PipelineQueue(1)
+    consuming = [True]
+    queue.set_consumer(lambda: consuming[0])
+    queue.put("a")
+    with pytest.raises(Exception, match="exited"):
+        consuming[0] = False
+        queue.put("b")
+    # Timeout is still kept while consumer is running
+    consuming[0] = True
+    start = time.perf_counter()
+    with pytest.raises(Exception):
+        queue.put("b", 0.05)
+    assert time.perf_counter() - start < 1
+
+
+def test_harvester_stops_if_pipeline_has_exited(tmp_path, monkeypatch):
+    monkeypatch.setattr(PipelineQueue, "CHECK_INTERVAL", 0.01)
+    source_path = tmp_path / "source"
+    source_path.mkdir()
+    for i in range(4):
+        with open(str(source_path / ("%d.pdf" % i)), 'wb') as file:
+            file.write(b'%PDF-1.4\n' + bytes(100))
+    first_stage = File([])
+    first_stage.add_stage(DiskImage([]))
+    pipeline = Pipeline(first_stage, "PDF", str(tmp_path), capacity=1)
+    # Pipeline exits before the harvester puts the files into its queue
+    pipeline.start()
+    pipeline.add_to_queue("/END/")
+    pipeline.join()
+    monkeypatch.setitem(pipeline_by_file_type, "PDF", pipeline)
+    # (Type is known without libmagic)
+    monkeypatch.setattr(FileHarvester, "_detect", staticmethod(lambda filename: (filename, "PDF document")))
+    harvester = FileHarvester(str(source_path), ["PDF"])
+    harvester.set_batch_size(1)
+    harvester.run()
+    assert "exited" in str(harvester.get_error())
+
+
+def test_async_pipeline_raises_exception_of_failed_file(tmp_path):
+    from lib.AsyncPipeline import AsyncPipeline
+    from lib.PipelineController import PipelineController
+    filenames = []
+    for name in ("a.bin", "c.bin"):
+        filename = str(tmp_path / name)
+        with open(filename, 'wb') as file:
+            file.write(bytes(1000))
+        filenames.append(filename)
+    pipeline = AsyncPipeline({"stages": [{"File": []}, {"DiskImage": []}]}, PipelineController._build_stages,
+                             "data", str(tmp_path), 2)
+    pipeline.add_batch([(filenames[0], "data"), (str(tmp_path / "b.bin"), "data"), (filenames[1], "data")])
+    pipeline.add_to_queue("/END/")
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(pipeline._run())
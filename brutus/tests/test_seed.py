@@ -0,0 +1,59 @@
+import os
+import json
+import pytest
+from lib.ChunkStore import ChunkStore
+from lib.DiskImageSampler import DiskImageSampler
+from lib.Background import create_background
+
+
+# Write chunks of a few files into a chunk store and return its folder
+@pytest.fixture
+def contents_path(tmp_path):
+    path = str(tmp_path / "contents")
+    os.mkdir(path)
+    chunk_store = ChunkStore(path, "store")
+    for i in range(5):
+        for number in range(1, 4):
+            chunk_store.append("file_%d" % i, number, bytes([i * 16 + number]) * (1000 * number))
+    chunk_store.close()
+    return path
+
+
+# Generate image and return image, truth map and parameters
+def generate(contents_path, image_path, **options):
+    sampler = DiskImageSampler(1, contents_path, image_path, False, **options)
+    sampler.generate_image()
+    sampler.fill_truth_map()
+    result = []
+    for name in ("disk_image.img", "truth_map.txt", "parameters.json"):
+        with open(os.path.join(image_path, "Disk Image", name), 'rb') as result_file:
+            result.append(result_file.read())
+    return result
+
+
+def test_same_seed_results_in_same_image(contents_path, tmp_path):
+    image = generate(contents_path, str(tmp_path / "a"), seed=42)
+    assert generate(contents_path, str(tmp_path / "b"), seed=42) == image
+    # Streamed image only differs in the way it is written
+    assert generate(contents_path, str(tmp_path / "c"), seed=42, stream=True) == image
+    assert generate(contents_path, str(tmp_path / "d"), seed=43)[:2] != image[:2]
+
+
+def test_drawn_seed_regenerates_image(contents_path, tmp_path):
+    image = generate(contents_path, str(tmp_path / "a"))
+    seed = json.loads(image[2])["seed"][0]
+    assert generate(contents_path, str(tmp_path / "b"), seed=seed) == image
+    # A seed of 0 is a seed of its own
+    assert json.loads(generate(contents_path, str(tmp_path / "c"), seed=0)[2])["seed"] == [0]
+
+
+@pytest.mark.parametrize("name", ["random", "zero", "pattern"])
+def test_background_blocks_do_not_depend_on_order(name):
+    import numpy
+    background = create_background(name, numpy.random.SeedSequence(7))
+    whole = background.get_block(0, 3 * 2**20)
+    # Any part can be generated on its own (e.g. by a streamed or virtual image)
+    for position, length in [(5, 100), (2**20 - 10, 30), (2 * 2**20 + 1, 2**20 - 1)]:
+        part = create_background(name, numpy.random.SeedSequence(7)).get_block(position, length)
+        assert part == whole[position:position + length]
+    assert create_background(name, numpy.random.SeedSequence(7)).get_block(0, 3 * 2**20) == whole
@@ -0,0 +1,93 @@
+import os
+import pytest
+from lib.ChunkStore import ChunkStore
+from lib.stages import File, FileJPEG, Noise, HeaderJPEG, Split, SaveHashes, DiskImage
+
+PIPELINES = [
+    [(File, []), (SaveHashes, []), (Noise, ["zero", 7]), (DiskImage, [])],
+    [(File, []), (Noise, ["flip", 0.01, 3]), (Split, [300]), (SaveHashes, ["crc32"]), (DiskImage, [])],
+    [(FileJPEG, []), (HeaderJPEG, []), (Split, [250]), (SaveHashes, []), (DiskImage, [])],
+    [(File, []), (Noise, ["burst", 2, 40, 5]), (SaveHashes, ["blake2b"]), (DiskImage, [])],
+]
+
+
+# Process files by linked list of stages (in blocks of 1000 bytes if streamed) and return records with contents
+def run(pipeline, filenames, contents_path, stream):
+    first_stage = None
+    for stage_class, args in reversed(pipeline):
+        stage = stage_class(args)
+        if first_stage is not None:
+            stage.add_stage(first_stage)
+        first_stage = stage
+    first_stage.BLOCK_SIZE = 1000
+    first_stage.set_stream(stream)
+    chunk_store = ChunkStore(contents_path, "store")
+    first_stage.set_chunk_store(chunk_store)
+    for filename in filenames:
+        first_stage.set_type("data")
+        first_stage.set_name(filename)
+        first_stage.set_contents_path(contents_path)
+        first_stage.start()
+    chunk_store.close()
+    return [record[1:] + (bytes(ChunkStore.map_data(record[0])[record[3]:record[3] + record[4]]),)
+            for record in ChunkStore.read_index(contents_path)]
+
+
+@pytest.mark.parametrize("pipeline", PIPELINES)
+def test_stream_and_list_produce_same_contents(pipeline, tmp_path):
+    filenames = []
+    for name, size in [("a.bin", 5500), ("b.bin", 1000), ("c.bin", 0), ("d.bin", 420)]:
+        filename = str(tmp_path / name)
+        with open(filename, 'wb') as file:
+            file.write(bytes(i % 251 for i in range(size)))
+        filenames.append(filename)
+    os.mkdir(tmp_path / "list")
+    os.mkdir(tmp_path / "stream")
+    records = run(pipeline, filenames, str(tmp_path / "list"), False)
+    assert len(records) > len(filenames) - 1
+    assert run(pipeline, filenames, str(tmp_path / "stream"), True) == records
+
+
+@pytest.mark.parametrize("spool_size", [ChunkStore.SPOOL_SIZE, 100])
+def test_interleaved_pieces_stay_contiguous(spool_size, tmp_path, monkeypatch):
+    monkeypatch.setattr(ChunkStore, "SPOOL_SIZE", spool_size)
+    chunk_store = ChunkStore(str(tmp_path), "store")
+    pieces = {name: [(bytes([ord(name)]) * 60, number == 4) for number in range(5)] for name in "ab"}
+    writers = [chunk_store.write_pieces(name, 1, pieces[name]) for name in "ab"]
+    # Pieces of both chunks are passed on alternately (e.g. by two async pipelines)
+    for piece_a, piece_b in zip(*writers):
+        assert (piece_a[0][:1], piece_b[0][:1]) == (b'a', b'b')
+    chunk_store.append("c", 1, b'c' * 10)
+    chunk_store.close()
+    records = ChunkStore.read_index(str(tmp_path))
+    data_map = ChunkStore.map_data(records[0][0])
+    assert [(record[1], bytes(data_map[record[3]:record[3] + record[4]])) for record in records] == \
+        [("a", b'a' * 300), ("b", b'b' * 300), ("c", b'c' * 10)]
+
+
+def test_streamed_chunks_can_be_written_twice(tmp_path):
+    filename = str(tmp_path / "a.bin")
+    with open(filename, 'wb') as file:
+        file.write(bytes(i % 251 for i in range(5500)))
+    os.mkdir(tmp_path / "contents")
+    records = run([(File, []), (Split, [2000]), (DiskImage, []), (DiskImage, [])], [filename],
+                  str(tmp_path / "contents"), True)
+    # Both stages write each chunk
+    assert [record[1] for record in records] == [1, 1, 2, 2, 3, 3]
+    assert [record[-1] for record in records[::2]] == [record[-1] for record in records[1::2]]
+    assert b''.join(record[-1] for record in records[::2]) == bytes(i % 251 for i in range(5500))
+
+def test_maps_of_changed_data_files_are_dropped(tmp_path):
+    chunk_store = ChunkStore(str(tmp_path), "store")
+    chunk_store.append("a", 1, b'a' * 100)
+    chunk_store.close()
+    data_path = ChunkStore.read_index(str(tmp_path))[0][0]
+    assert bytes(ChunkStore.get_data_map(data_path)) == b'a' * 100
+    chunk_store.append("a", 2, b'b' * 100)
+    chunk_store.close()
+    assert len(ChunkStore.get_data_map(data_path)) == 200
+    # Store is written anew after it has been cleared
+    ChunkStore.clear(str(tmp_path))
+    chunk_store.append("a", 1, b'c' * 50)
+    chunk_store.close()
+    assert bytes(ChunkStore.get_data_map(data_path)) == b'c' * 50
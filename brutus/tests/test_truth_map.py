@@ -0,0 +1,48 @@
+import pytest
+from lib.core import Chunk
+from lib.TruthMap import TruthMap
+
+
+# Return chunks of 100 bytes at offsets 0, 200, 400, ... (with gaps of background between them)
+def make_chunks(count):
+    chunks = []
+    for i in range(count):
+        chunk = Chunk()
+        chunk.set_content(bytearray(100))
+        chunk.set_pos_number(i + 1)
+        chunk.set_offset(i * 200)
+        chunk.set_filename("file_%d.jpg" % (i % 3))
+        # Hashes of several algorithms (and chunks without hash) share one truth map
+        chunk.set_sha256(["%064x" % i, "blake2b:%0128x" % i, "crc32:%08x" % i, ""][i % 4])
+        chunks.append(chunk)
+    return chunks
+
+
+@pytest.mark.parametrize("index_step", [0, 1, 4, TruthMap.INDEX_STEP])
+def test_binary_truth_map_round_trip(index_step, tmp_path):
+    chunks = make_chunks(25)
+    path = str(tmp_path / "truth_map.bin")
+    TruthMap.write(path, chunks, index_step)
+    truth_map = TruthMap(path)
+    assert len(truth_map) == 25
+    assert list(truth_map) == [(chunk.pos_number, 100, chunk.offset, chunk.filename, chunk.sha256)
+                               for chunk in chunks]
+    for chunk in chunks:
+        assert truth_map.find(chunk.offset)[2] == chunk.offset
+        assert truth_map.find(chunk.offset + 99)[2] == chunk.offset
+        assert truth_map.find(chunk.offset + 100) is None  # Background
+    assert truth_map.find(10**9) is None
+
+    # Text converted from binary truth map equals text truth map
+    truth_map.to_text(str(tmp_path / "truth_map.txt"))
+    truth_map.close()
+    with open(str(tmp_path / "truth_map.txt")) as text_file:
+        assert text_file.read() == TruthMap.TEXT_HEADER + "".join(str(chunk) + "\n" for chunk in chunks)
+
+
+def test_empty_binary_truth_map(tmp_path):
+    path = str(tmp_path / "truth_map.bin")
+    TruthMap.write(path, [])
+    truth_map = TruthMap(path)
+    assert len(truth_map) == 0
+    assert truth_map.find(0) is None
@@ -0,0 +1,121 @@
+import io
+import os
+import threading
+import http.client
+import pytest
+from lib.ChunkStore import ChunkStore
+from lib.DiskImageSampler import DiskImageSampler
+from lib.VirtualImage import VirtualImageServer, _RangeRequestHandler
+
+
+# Write chunks of a few files into a chunk store and return its folder
+@pytest.fixture
+def contents_path(tmp_path):
+    path = str(tmp_path / "contents")
+    os.mkdir(path)
+    chunk_store = ChunkStore(path, "store")
+    for i in range(5):
+        for number in range(1, 4):
+            chunk_store.append("file_%d" % i, number, bytes([i * 16 + number]) * (1000 * number))
+    chunk_store.close()
+    return path
+
+
+# Return streamed image and virtual image generated with the same seed
+@pytest.fixture(params=[False, True], ids=["chunks", "merged"])
+def images(request, contents_path, tmp_path):
+    sampler = DiskImageSampler(1, contents_path, str(tmp_path / "streamed"), request.param, stream=True, seed=42)
+    sampler.generate_image()
+    with open(str(tmp_path / "streamed" / "Disk Image" / "disk_image.img"), 'rb') as image_file:
+        image = image_file.read()
+    sampler = DiskImageSampler(1, contents_path, str(tmp_path / "virtual"), request.param, seed=42, serve=0)
+    sampler.generate_image()
+    return image, sampler.virtual_image
+
+
+def test_virtual_image_matches_streamed_image(images):
+    image, virtual_image = images
+    assert virtual_image.size == len(image)
+    assert virtual_image.read_at(0, len(image)) == image
+    # Ranges within chunks, across chunks and background and beyond the end
+    for chunk in virtual_image.chunks[:5]:
+        for position, length in [(chunk.offset, len(chunk)), (chunk.offset - 7, len(chunk) + 14),
+                                 (chunk.offset + 3, 5)]:
+            assert virtual_image.read_at(position, length) == image[position:position + length]
+    assert virtual_image.read_at(len(image) - 10, 100) == image[-10:]
+    assert virtual_image.read_at(len(image), 100) == b''
+
+
+def test_read_and_seek_follow_position(images):
+    image, virtual_image = images
+    offset = virtual_image.chunks[2].offset
+    assert virtual_image.seek(offset - 100) == offset - 100
+    assert virtual_image.read(300) == image[offset - 100:offset + 200]
+    assert virtual_image.tell() == offset + 200
+    virtual_image.seek(50, io.SEEK_CUR)
+    assert virtual_image.read(10) == image[offset + 250:offset + 260]
+    virtual_image.seek(-20, io.SEEK_END)
+    assert virtual_image.read() == image[-20:]
+    assert virtual_image.read(10) == b''
+    with pytest.raises(ValueError):
+        virtual_image.seek(-1)
+    # Buffered reader works on top of the virtual image
+    virtual_image.seek(0)
+    assert io.BufferedReader(virtual_image).read() == image
+
+
+@pytest.mark.parametrize("header, byte_range", [
+    ("bytes=0-499", (0, 499)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=-300", (700, 999)),
+    ("bytes=-3000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=1000-", None),
+    ("bytes=20-10", None),
+    ("bytes=-", None),
+    ("bytes=0-1,5-9", None),
+    ("items=0-1", None),
+])
+def test_range_header_is_parsed(header, byte_range):
+    assert _RangeRequestHandler._parse_range(header, 1000) == byte_range
+
+
+@pytest.fixture
+def server(images):
+    image, virtual_image = images
+    server = VirtualImageServer(virtual_image, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield image, server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+# Return status, headers and body of a GET request for range (whole image if range is None)
+def request(port, byte_range=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.request("GET", "/", headers={"Range": byte_range} if byte_range is not None else {})
+    response = connection.getresponse()
+    result = response.status, dict(response.getheaders()), response.read()
+    connection.close()
+    return result
+
+
+def test_server_answers_range_requests(server):
+    image, port = server
+    size = len(image)
+    status, headers, body = request(port)
+    assert (status, body) == (200, image)
+    assert headers["Accept-Ranges"] == "bytes"
+
+    status, headers, body = request(port, "bytes=1000-1999")
+    assert (status, headers["Content-Range"], body) == (206, "bytes 1000-1999/%d" % size, image[1000:2000])
+    # Open-ended range
+    status, headers, body = request(port, "bytes=%d-" % (size - 5000))
+    assert (status, headers["Content-Range"], body) == (206, "bytes %d-%d/%d" % (size - 5000, size - 1, size),
+                                                        image[-5000:])
+    # Suffix range
+    status, headers, body = request(port, "bytes=-123")
+    assert (status, headers["Content-Length"], body) == (206, "123", image[-123:])
+    # Unsatisfiable range
+    status, headers, body = request(port, "bytes=%d-" % size)
+    assert (status, headers["Content-Range"], body) == (416, "bytes */%d" % size, b'')